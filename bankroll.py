@@ -0,0 +1,239 @@
+import math
+import argparse
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import CARD_COUNT_PER_DECK, MAX_DECK_PER_SERIES, MAX_CARDS_PER_SERIES
+from counting import COUNT_SYSTEMS, DEFAULT_COUNT_SYSTEM, DECK_RESOLUTION
+from export import read_records, payout_units
+from stats import Z_95
+from vectorized import deal_shoes, play_rounds, play_shoes_objects
+
+SHOES = 20_000  # shoes played for the sample the trajectories are drawn from
+TRAJECTORIES = 10_000
+ROUNDS = 20_000  # games in every trajectory, about 200 hours at a full table
+BANKROLL = 400  # units
+# sits out below +2 and ramps 1 - 8 from where the default count turns positive, a flat base bet on every game
+# loses more at the low counts than the ramp wins back
+DEFAULT_SPREAD = '0,2:1,3:2,4:4,5:8'
+
+
+@dataclass(frozen=True)
+class BetSpread:
+    """Units bet at the true count a bet is placed at: the bet of the highest ramp count at or below it, `base`
+    below the whole ramp. A base of 0 sits the low counts out.
+    """
+
+    ramp: Tuple[Tuple[float, float], ...] = ((2, 1), (3, 2), (4, 4), (5, 8))
+    base: float = 0
+
+    # compiled from the ramp
+    _counts: np.ndarray = field(init=False, repr=False, compare=False)
+    _units: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'ramp', tuple((float(count), float(units)) for count, units in self.ramp))
+        counts = [count for count, _ in self.ramp]
+        if counts != sorted(set(counts)):
+            raise ValueError(f"ramp counts must increase, got {counts}")
+        units = [self.base] + [units for _, units in self.ramp]
+        if min(units) < 0 or max(units) == 0:
+            raise ValueError(f"bets must be at least 0 and one of them more, got {units}")
+        object.__setattr__(self, '_counts', np.array(counts))
+        object.__setattr__(self, '_units', np.array(units, dtype=float))
+
+    @classmethod
+    def parse(cls, spec: str) -> 'BetSpread':
+        """From e.g. '1,3:2,4:4,5:8': a base bet, then count:units steps"""
+        base = 1.0
+        ramp = []
+        for step in spec.split(','):
+            if ':' in step:
+                count, units = step.split(':')
+                ramp.append((float(count), float(units)))
+            else:
+                base = float(step)
+        return cls(tuple(ramp), base)
+
+    def bets(self, true_counts: np.ndarray) -> np.ndarray:
+        return self._units[np.searchsorted(self._counts, true_counts, side='right')]
+
+    def __str__(self):
+        return ','.join([f"{self.base:g}"] + [f"{count:g}:{units:g}" for count, units in self.ramp])
+
+
+class RoundSample:
+    """Games grouped by shoe, in the order dealt: the true count each bet was placed at and its payout in points.
+
+    Trajectories draw a whole shoe at a time from it, so the count runs on from game to game as it does at a table.
+    Games of several seats are taken as one player betting the same on every seat.
+    """
+
+    def __init__(self, shoe: np.ndarray, bet_count: np.ndarray, points: np.ndarray):
+        shoe = np.asarray(shoe)
+        order = np.argsort(shoe, kind='stable')
+        self.bet_count = np.asarray(bet_count, dtype=float)[order]
+        self.points = np.asarray(points, dtype=float)[order]
+        _, self.starts, games = np.unique(shoe[order], return_index=True, return_counts=True)
+        self.ends = self.starts + games
+
+    @classmethod
+    def from_shoes(cls, shoes: int = SHOES, seed: Optional[int] = None, decks: int = MAX_DECK_PER_SERIES,
+                   max_cards: int = MAX_CARDS_PER_SERIES, count_system: str = DEFAULT_COUNT_SYSTEM,
+                   deck_resolution: float = DECK_RESOLUTION) -> 'RoundSample':
+        # played by the vectorized engine, so basic strategy and the default rules
+        dealt = deal_shoes(shoes, np.random.default_rng(seed), decks)
+        shoe, bet_count, half_points = play_rounds(dealt, max_cards, count_system, deck_resolution)
+        return cls(shoe, bet_count, half_points / 2)
+
+    @classmethod
+    def from_export(cls, path: str) -> 'RoundSample':
+        # any table game_play can run, strategies, rules and shuffles included
+        records = read_records(path)
+        return cls(records['shoe'], records['bet_count'], records['payout'] / payout_units(path))
+
+    @property
+    def shoes(self) -> int:
+        return len(self.starts)
+
+    def __len__(self):
+        return len(self.points)
+
+
+@dataclass
+class BankrollReport:
+    spread: BetSpread
+    bankroll: float
+    rounds: int
+    trajectories: int
+    ruined: int
+    final: np.ndarray  # bankroll of every trajectory at the end, a ruined one where it went broke
+    ev: float  # units won a round
+    sd: float  # standard deviation of a round in units
+    average_bet: float  # units a round, rounds sat out included
+
+    @property
+    def risk_of_ruin(self) -> float:
+        return self.ruined / self.trajectories
+
+    @property
+    def ruin_error(self) -> float:
+        p = self.risk_of_ruin
+        return math.sqrt(p * (1 - p) / self.trajectories)
+
+    @property
+    def n0(self) -> float:
+        """Rounds for the expected win to equal one standard deviation of the result"""
+        return (self.sd / self.ev) ** 2 if self.ev > 0 else math.inf
+
+    @property
+    def lifetime_risk(self) -> float:
+        # never going broke, however long the play: the diffusion approximation exp(-2 ev B / var)
+        return math.exp(-2 * self.ev * self.bankroll / self.sd ** 2) if self.ev > 0 else 1.0
+
+    def summary(self) -> str:
+        median = float(np.median(self.final))
+        return (f"spread {self.spread}: bet {self.average_bet:.2f}  EV {self.ev * 100:+.3f} / 100 rounds  "
+                f"SD {self.sd:.3f}  N0 {self.n0:,.0f}  risk of ruin {self.risk_of_ruin:.2%} ± "
+                f"{Z_95 * self.ruin_error:.2%} in {self.rounds:,} rounds ({self.lifetime_risk:.2%} lifetime)  "
+                f"median bankroll {median:,.0f}")
+
+
+def simulate_bankrolls(sample: RoundSample, spread: BetSpread, bankroll: float = BANKROLL, rounds: int = ROUNDS,
+                       trajectories: int = TRAJECTORIES, seed: Optional[int] = None) -> BankrollReport:
+    """Plays `trajectories` bankrolls in lockstep for `rounds` games each, every one through shoes drawn from
+    `sample`. A bankroll that falls to 0 or below is ruined and stops playing."""
+    rng = np.random.default_rng(seed)
+    won = spread.bets(sample.bet_count) * sample.points
+    shoes = rng.integers(sample.shoes, size=trajectories)
+    position = sample.starts[shoes]
+    end = sample.ends[shoes]
+    money = np.full(trajectories, float(bankroll))
+    alive = np.ones(trajectories, dtype=bool)
+
+    for _ in range(rounds):
+        money += won[position] * alive
+        alive &= money > 0
+        position += 1
+        done = position == end
+        if done.any():
+            shoes = rng.integers(sample.shoes, size=int(done.sum()))
+            position[done] = sample.starts[shoes]
+            end[done] = sample.ends[shoes]
+
+    # the long run of shoes drawn at random averages over every game of the sample
+    return BankrollReport(spread, bankroll, rounds, trajectories, int((~alive).sum()), money, float(won.mean()),
+                          float(won.std(ddof=1)), float(spread.bets(sample.bet_count).mean()))
+
+
+def verify(seed: int = 0, shoes: int = 50) -> List[str]:
+    """Failed checks: trajectories against the gambler's ruin, and the vectorized games against the object engine"""
+    failures = []
+
+    # even money won with p = 0.51 from a bankroll of 20 is lost with probability (q / p) ** 20
+    wins = 51
+    sample = RoundSample(np.arange(100), np.zeros(100), np.where(np.arange(100) < wins, 1.0, -1.0))
+    report = simulate_bankrolls(sample, BetSpread((), 1), bankroll=20, rounds=20_000, trajectories=20_000, seed=seed)
+    expected = ((100 - wins) / wins) ** 20
+    if abs(report.risk_of_ruin - expected) > 4 * report.ruin_error + 0.005:
+        failures.append(f"gambler's ruin {report.risk_of_ruin:.4f}, expected {expected:.4f}")
+
+    # the same shoes game by game: the count each bet is placed at and what it pays
+    dealt = deal_shoes(shoes, np.random.default_rng(seed))
+    _, bet_count, half_points = play_rounds(dealt)
+    with tempfile.TemporaryDirectory() as directory:
+        path = f"{directory}/export.bin"
+        play_shoes_objects(dealt, export_file=path)
+        records = np.array(read_records(path))
+    if not (np.allclose(records['bet_count'], bet_count) and np.array_equal(records['payout'], half_points)):
+        failures.append("vectorized games differ from the object engine's export")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bankroll trajectories of a bet spread on the true count")
+    parser.add_argument("--spread", nargs="+", default=[DEFAULT_SPREAD],
+                        help="base bet then count:units steps, e.g. 1,3:2,4:4,5:8, several are run on the same shoes")
+    parser.add_argument("--bankroll", type=float, default=BANKROLL, help="units")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="games in every trajectory")
+    parser.add_argument("--trajectories", type=int, default=TRAJECTORIES)
+    parser.add_argument("--export", help="draw the games from a game_play export file instead of playing shoes")
+    parser.add_argument("--shoes", type=int, default=SHOES, help="shoes played for the games drawn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--decks", type=int, default=MAX_DECK_PER_SERIES)
+    parser.add_argument("--penetration", type=float, default=MAX_CARDS_PER_SERIES / (CARD_COUNT_PER_DECK *
+                                                                                     MAX_DECK_PER_SERIES))
+    parser.add_argument("--count-system", choices=tuple(COUNT_SYSTEMS), default=DEFAULT_COUNT_SYSTEM)
+    parser.add_argument("--deck-resolution", type=float, default=DECK_RESOLUTION)
+    parser.add_argument("--verify", action="store_true",
+                        help="check the trajectories against the gambler's ruin and the games against game_play")
+    args = parser.parse_args()
+
+    if args.verify:
+        failures = verify(args.seed)
+        print("Bankroll OK" if not failures else '\n'.join(failures))
+        exit(1 if failures else 0)
+
+    if args.export:
+        sample = RoundSample.from_export(args.export)
+    else:
+        sample = RoundSample.from_shoes(args.shoes, args.seed, args.decks,
+                                        round(args.decks * CARD_COUNT_PER_DECK * args.penetration),
+                                        args.count_system, args.deck_resolution)
+    print(f"{len(sample):,} games from {sample.shoes:,} shoes")
+    for spec in args.spread:
+        # every spread meets the same shoes in the same order
+        report = simulate_bankrolls(sample, BetSpread.parse(spec), args.bankroll, args.rounds, args.trajectories,
+                                    args.seed)
+        print(report.summary())
+
+
+if __name__ == '__main__':
+    main()
+
+
+__all__ = ['BetSpread', 'RoundSample', 'BankrollReport', 'simulate_bankrolls', 'verify', 'BANKROLL',
+           'DEFAULT_SPREAD']
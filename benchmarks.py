@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from typing import Callable, Dict, List, Optional
+
+from config import CARD_COUNT_PER_DECK, MAX_DECK_PER_SERIES, MAX_CARDS_PER_SERIES
+from models import PlayingCardDeck, Hand, PLAYING_CARDS
+from settings import GameConfig
+from util import get_player_move
+from strategy_table import lookup_player_move, default_table
+
+USE_RESOURCE = True
+
+try:
+    import resource
+except ModuleNotFoundError:
+    # not on Windows, peak memory is left out
+    USE_RESOURCE = False
+
+SCALES = {'1k': 1_000, '100k': 100_000, '10m': 10_000_000}
+DEFAULT_SCALES = ('1k', '100k')
+BASELINE_FILE = 'benchmark_baseline.json'
+RESULTS_FILE = 'benchmark.json'
+THRESHOLD = 0.2  # slower or bigger than the baseline by more than this share is a regression
+SEED = 1234
+CARDS_PER_HAND = 5  # about what a game takes from the shoe
+
+
+def _random_hands(n: int, rng: random.Random) -> List[Hand]:
+    return [Hand(rng.sample(PLAYING_CARDS, rng.choice((2, 2, 3))), is_dealer=False) for _ in range(n)]
+
+
+def bench_shuffle_deal(n: int, seed: int) -> float:
+    deck = PlayingCardDeck(random.Random(seed))
+    start = time.perf_counter()
+    for _ in range(n * CARDS_PER_HAND // MAX_CARDS_PER_SERIES + 1):
+        deck.shuffle()
+        for _ in range(MAX_CARDS_PER_SERIES):
+            deck.deal()
+    return time.perf_counter() - start
+
+
+def bench_hand_total(n: int, seed: int) -> float:
+    hands = _random_hands(min(n, 10_000), random.Random(seed))
+    start = time.perf_counter()
+    for i in range(n):
+        hands[i % len(hands)].total
+    return time.perf_counter() - start
+
+
+def _decisions(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    hands = _random_hands(min(n, 10_000), rng)
+    return [(hand, rng.choice(PLAYING_CARDS), rng.choice((-4, -1, 0, 0, 0, 1, 3, 5)), len(hand) == 2) for hand in hands]
+
+
+def bench_get_player_move(n: int, seed: int) -> float:
+    decisions = _decisions(n, seed)
+    start = time.perf_counter()
+    for i in range(n):
+        get_player_move(*decisions[i % len(decisions)])
+    return time.perf_counter() - start
+
+
+def bench_lookup_player_move(n: int, seed: int) -> float:
+    decisions = _decisions(n, seed)
+    lookup_player_move(*decisions[0])  # compiles the table outside the timing
+    start = time.perf_counter()
+    for i in range(n):
+        lookup_player_move(*decisions[i % len(decisions)])
+    return time.perf_counter() - start
+
+
+def bench_resolve_game(n: int, seed: int) -> float:
+    from game_play import Blackjack
+
+    bj = Blackjack(GameConfig(max_games=n, interactive=False, export_file=None, log_level='off', seed=seed))
+    bj.headless = True
+    elapsed = 0.0
+    for _ in range(n):
+        if bj.dealer.deck.should_create_new_deck():
+            bj.dealer.shuffle()
+        bj.game += 1
+        bj.dealer.start_new_game(bj.players)
+        bj.starting_hands = ['' for _ in bj.players]
+        for player in bj.players:
+            bj.play_seat(player)
+        start = time.perf_counter()
+        bj.resolve_game()
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def bench_run(n: int, seed: int) -> float:
+    from game_play import Blackjack
+
+    default_table()  # compiled once per process, not part of a run
+    with tempfile.TemporaryDirectory() as directory:
+        bj = Blackjack(GameConfig(max_games=n, interactive=False, export_file=None, log_level='off', seed=seed))
+        start = time.perf_counter()
+        bj.run(os.path.join(directory, 'table.txt'), os.path.join(directory, 'stats.txt'))
+        return time.perf_counter() - start
+
+
+# every benchmark takes the number of hands and a seed, and returns the seconds spent in the timed part
+BENCHMARKS: Dict[str, Callable[[int, int], float]] = {
+    'shuffle_deal': bench_shuffle_deal,
+    'hand_total': bench_hand_total,
+    'get_player_move': bench_get_player_move,
+    'lookup_player_move': bench_lookup_player_move,
+    'resolve_game': bench_resolve_game,
+    'run': bench_run,
+}
+
+
+def _peak_memory_mb() -> Optional[float]:
+    if not USE_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _measure(job) -> dict:
+    name, hands, seed = job
+    seconds = BENCHMARKS[name](hands, seed)
+    return {
+        'hands': hands,
+        'seconds': seconds,
+        'hands_per_sec': hands / seconds if seconds else None,
+        'peak_memory_mb': _peak_memory_mb(),
+    }
+
+
+def run_benchmarks(names: List[str], scales: List[str], seed: int = SEED) -> Dict[str, dict]:
+    """Runs every benchmark at every scale, each in a fresh process so the peak memory is its own"""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for scale in scales:
+        for name in names:
+            with context.Pool(1) as pool:
+                results[f"{name}@{scale}"] = pool.apply(_measure, ((name, SCALES[scale], seed),))
+            print(f"{name + '@' + scale:<28} {results[f'{name}@{scale}']['hands_per_sec']:>14,.0f} hands/sec", flush=True)
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float = THRESHOLD) -> List[str]:
+    """Benchmarks slower than the baseline, or using more memory, by more than `threshold`"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base['hands_per_sec'] and result['hands_per_sec'] < base['hands_per_sec'] * (1 - threshold):
+            regressions.append(f"{key}: {result['hands_per_sec']:,.0f} hands/sec, "
+                               f"baseline {base['hands_per_sec']:,.0f}")
+        if base.get('peak_memory_mb') and result['peak_memory_mb'] \
+                and result['peak_memory_mb'] > base['peak_memory_mb'] * (1 + threshold):
+            regressions.append(f"{key}: {result['peak_memory_mb']:.1f} MB peak, baseline {base['peak_memory_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the simulation hot paths")
+    parser.add_argument("--scales", nargs="+", choices=tuple(SCALES), default=DEFAULT_SCALES)
+    parser.add_argument("--only", nargs="+", choices=tuple(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON results file")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only or list(BENCHMARKS), args.scales, args.seed)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'shoe': {'decks': MAX_DECK_PER_SERIES, 'cards': MAX_DECK_PER_SERIES * CARD_COUNT_PER_DECK},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f)['results'], args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    print("No regressions" if not regressions else f"{len(regressions)} regressions")
+    exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
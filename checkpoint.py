@@ -0,0 +1,75 @@
+import os
+import zlib
+import pickle
+import struct
+
+CHECKPOINT_FILE = 'checkpoint.bin'
+
+_MAGIC = b'BJCHKPNT'
+_VERSION = 3
+_HEADER = struct.Struct('<8sII')  # magic, version, crc32 of the payload
+
+# a checkpoint only resumes a run dealing the same shoes, the game count and the reporting options may change
+RESUME_FIELDS = ('decks', 'penetration', 'seats', 'seed', 'rng', 'count_system', 'deck_resolution', 'strategies',
+                 'rules', 'shuffle')
+
+
+def snapshot(table) -> dict:
+    """Everything a Blackjack table needs to carry on from the shoe it just finished"""
+    return {
+        'config': {name: getattr(table.config, name) for name in RESUME_FIELDS},
+        'game': table.game,
+        'shoe': table.shoe,
+        'rng': table.dealer.deck.rng.getstate(),
+        'deck': table.dealer.deck.getstate(),
+        'counter': table.dealer.counter.getstate(),
+        'results': table.results,
+        'seat_results': table.seat_results,
+        'stats': table.stats,
+        'export_offset': table.exporter.tell() if table.exporter else None,
+    }
+
+
+def restore(table, state: dict):
+    mismatched = [
+        f"{name}={value!r} (run has {getattr(table.config, name)!r})"
+        for name, value in state['config'].items() if getattr(table.config, name) != value
+    ]
+    if mismatched:
+        raise ValueError(f"Checkpoint is for another table: {', '.join(mismatched)}")
+    table.game = state['game']
+    table.shoe = state['shoe']
+    table.dealer.deck.rng.setstate(state['rng'])
+    table.dealer.deck.setstate(state['deck'])
+    table.dealer.counter.setstate(state['counter'])
+    table.results = state['results']
+    table.seat_results = state['seat_results']
+    table.stats = state['stats']
+    # the target may be changed on resume, e.g. to keep going for a tighter EV
+    table.stats.target_error = table.config.target_error
+
+
+def save_checkpoint(state: dict, path: str = CHECKPOINT_FILE):
+    payload = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+    # written next to the checkpoint and renamed over it, a crash mid write leaves the previous one intact
+    temp = f"{path}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load_checkpoint(path: str = CHECKPOINT_FILE) -> dict:
+    with open(path, 'rb') as f:
+        magic, version, crc = _HEADER.unpack(f.read(_HEADER.size))
+        payload = f.read()
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not a version {_VERSION} checkpoint")
+    if zlib.crc32(payload) != crc:
+        raise ValueError(f"{path} is corrupt")
+    return pickle.loads(zlib.decompress(payload))
+
+
+__all__ = ['snapshot', 'restore', 'save_checkpoint', 'load_checkpoint', 'CHECKPOINT_FILE', 'RESUME_FIELDS']
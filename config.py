@@ -3,9 +3,13 @@ MAX_GAMES = 2_000
 MAX_DECK_PER_SERIES = 6
 CARD_COUNT_PER_DECK = 52
 MAXIMUM_PLAYERS = 1
+TABLE_SEATS = 7  # seats at a full table
 INTERACTIVE = True
 
-EXPORT_FILE = 'export.txt'
+EXPORT_FILE = 'export.bin'
+LOG_FILE = './log.txt'
+LOG_BUFFER_SIZE = 10_000  # records held in memory before the game loop waits for the writer
+LOG_BATCH_SIZE = 500  # records written between flushes
 
 Hearts = "\u2665"
 Spades = "\u2660"
@@ -0,0 +1,75 @@
+import math
+from typing import Dict, Tuple
+
+from config import card_values, CARD_COUNT_PER_DECK, MAX_DECK_PER_SERIES
+
+# count tag for every card value 2 - 11, faces share the 10 tag
+COUNT_SYSTEMS: Dict[str, Tuple[int, ...]] = {
+    # the counts the cards are created with in config.card_values
+    'default': tuple(dict(card_values)['A' if value == 11 else str(value)] for value in range(2, 12)),
+    'hi-lo': (1, 1, 1, 1, 1, 0, 0, 0, -1, -1),
+    'hi-opt-ii': (1, 1, 2, 2, 1, 1, 0, 0, -2, 0),
+    'omega-ii': (1, 1, 2, 2, 2, 1, 0, -1, -2, 0),
+    # never moves, so index plays stay on their true count 0 column: basic strategy without deviations
+    'none': (0,) * 10,
+}
+DEFAULT_COUNT_SYSTEM = 'default'
+DECK_RESOLUTION = 1.0  # decks left are rounded up to whole decks, 0 divides by the exact number
+
+
+def decks_remaining(unseen: int, resolution: float = DECK_RESOLUTION) -> float:
+    if not resolution:
+        return unseen / CARD_COUNT_PER_DECK
+    return math.ceil(unseen / (CARD_COUNT_PER_DECK * resolution)) * resolution
+
+
+class ShoeCounter:
+    """Counts the cards of a shoe as the table sees them. Every update and query is O(1)"""
+
+    def __init__(self, decks: int = MAX_DECK_PER_SERIES, system: str = DEFAULT_COUNT_SYSTEM,
+                 resolution: float = DECK_RESOLUTION):
+        if system not in COUNT_SYSTEMS:
+            raise ValueError(f"Unknown count system: {system}")
+        self.decks = decks
+        self.system = system
+        self.resolution = resolution
+        # indexed by card value, so 0 and 1 are never used
+        self.tags = (0, 0) + COUNT_SYSTEMS[system]
+        self.remaining = [0] * 12
+        self.unseen = 0
+        self.running_count = 0
+        self.reset()
+
+    def reset(self):
+        for value in range(2, 12):
+            self.remaining[value] = (16 if value == 10 else 4) * self.decks
+        self.unseen = CARD_COUNT_PER_DECK * self.decks
+        self.running_count = 0
+
+    def see(self, value: int):
+        self.remaining[value] -= 1
+        self.unseen -= 1
+        self.running_count += self.tags[value]
+
+    def getstate(self) -> Tuple[int, int, Tuple[int, ...]]:
+        return self.running_count, self.unseen, tuple(self.remaining)
+
+    def setstate(self, state: Tuple[int, int, Tuple[int, ...]]):
+        self.running_count, self.unseen, remaining = state
+        self.remaining[:] = remaining
+
+    @property
+    def decks_remaining(self) -> float:
+        return decks_remaining(self.unseen, self.resolution)
+
+    @property
+    def true_count(self) -> float:
+        decks = self.decks_remaining
+        return self.running_count / decks if decks else 0
+
+    def composition(self) -> Tuple[int, ...]:
+        # unseen cards per value 2 - 11, the composition exact_ev.ExactEV takes
+        return tuple(self.remaining[2:])
+
+
+__all__ = ['ShoeCounter', 'COUNT_SYSTEMS', 'DEFAULT_COUNT_SYSTEM', 'DECK_RESOLUTION', 'decks_remaining']
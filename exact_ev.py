@@ -0,0 +1,386 @@
+import time
+import argparse
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import MAX_DECK_PER_SERIES
+from enums import PlayerMove
+from models import PlayingCard
+from strategy_table import default_table, table_index, true_count_bucket, HARD, SOFT, PAIR, ACE_PAIR
+
+RANKS = tuple(range(2, 12))  # card values, faces count 10 and aces 11
+TEN = RANKS.index(10)
+ACE = RANKS.index(11)
+
+CHARLIE_CARDS = 7
+DEALER_STANDS = 17
+BLACKJACK_PAYOUT = 1.5
+SURRENDER_PAYOUT = -0.5
+
+# dealer outcomes, final totals 17 - 21 then bust
+DEALER_TOTALS = (17, 18, 19, 20, 21)
+BUST = len(DEALER_TOTALS)
+OUTCOMES = BUST + 1
+
+Composition = Tuple[int, ...]  # cards left for every value in RANKS
+
+
+def shoe_composition(decks: int = MAX_DECK_PER_SERIES) -> Composition:
+    return tuple(16 * decks if value == 10 else 4 * decks for value in RANKS)
+
+
+def deck_composition(cards: Sequence[PlayingCard]) -> Composition:
+    """Composition of the cards left in a shoe, e.g. `deck_composition(dealer.deck.cards)`"""
+    counts = [0] * len(RANKS)
+    for card in cards:
+        counts[card.value - 2] += 1
+    return tuple(counts)
+
+
+def _total(hard: int, aces: int) -> int:
+    # same rule as Hand, aces count 1 in `hard` and one of them may count 11
+    return hard + 10 if aces and hard + 10 <= 21 else hard
+
+
+def _blackjack_rank(upcard: int) -> Optional[int]:
+    return ACE if upcard == 10 else TEN if upcard == 11 else None
+
+
+@lru_cache(maxsize=None)
+def _dealer_sequences(upcard: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Every way the dealer finishes from `upcard`, hole card first, leaving out blackjacks.
+    Orders of the same cards are equally likely, so sequences are grouped by the cards they take.
+    Returns the cards taken per rank, the number of cards, the outcome and the orders of every group"""
+    groups: Dict[Tuple[Tuple[int, ...], int], int] = {}
+    taken = [0] * len(RANKS)
+
+    def draw(hard: int, aces: int, drawn: int):
+        total = _total(hard, aces)
+        if total >= DEALER_STANDS:
+            key = (tuple(taken), total - DEALER_STANDS if total <= 21 else BUST)
+            groups[key] = groups.get(key, 0) + 1
+            return
+        for rank, value in enumerate(RANKS):
+            if drawn == 0 and upcard + value == 21:
+                # blackjacks are settled before anyone plays
+                continue
+            taken[rank] += 1
+            draw(hard + (1 if value == 11 else value), aces + (value == 11), drawn + 1)
+            taken[rank] -= 1
+
+    draw(1 if upcard == 11 else upcard, int(upcard == 11), 0)
+    counts = np.array([cards for cards, _ in groups])
+    outcomes = np.array([outcome for _, outcome in groups])
+    orders = np.array(list(groups.values()), dtype=np.float64)
+    return counts, counts.sum(axis=1), outcomes, orders
+
+
+def _stand_payouts(total: int, cards: int, doubled: bool, fourteen: bool) -> Tuple[float, ...]:
+    """Points for a single, unbusted hand against every dealer outcome, in the order of resolve_game"""
+    unit = 2 if doubled else 1
+    payouts = []
+    for outcome in range(OUTCOMES):
+        dealer = DEALER_TOTALS[outcome] if outcome < BUST else 22
+        if fourteen and dealer != total:
+            payouts.append(-2 if dealer > total else 2)
+        elif cards == CHARLIE_CARDS:
+            payouts.append(1)
+        elif outcome == BUST:
+            payouts.append(unit)
+        elif total == dealer:
+            payouts.append(0)
+        else:
+            payouts.append(-unit if total < dealer else unit)
+    return tuple(payouts)
+
+
+def _split_payouts(total: int, cards: int, doubled: bool) -> Tuple[float, ...]:
+    """Points for one unbusted split hand against every dealer outcome, as Blackjack.get_hand_point"""
+    unit = 2 if doubled else 1
+    payouts = []
+    for outcome in range(OUTCOMES):
+        if cards == CHARLIE_CARDS:
+            payouts.append(1)
+        elif outcome == BUST:
+            payouts.append(unit)
+        elif total == DEALER_TOTALS[outcome]:
+            payouts.append(0)
+        else:
+            payouts.append(-unit if total < DEALER_TOTALS[outcome] else unit)
+    return tuple(payouts)
+
+
+class ExactEV:
+    """Exact expected points per game for the house rules in game_play.Blackjack, played with the
+    compiled util.get_player_move strategy at a fixed true count.
+
+    Probabilities are computed from the cards left in the shoe and memoized by composition. The dealer's hole
+    card is never seen by the player, so it is drawn after the player's cards, which gives the same
+    probabilities as dealing it first. Burnt cards are unseen too and do not change them.
+    """
+
+    def __init__(self, composition: Optional[Composition] = None, true_count: float = 0.0):
+        self.composition = composition or shoe_composition()
+        self.true_count = true_count
+        self._bucket = true_count_bucket(true_count)
+        self._moves = default_table().moves
+        self._dealer: Dict[Tuple[Composition, int], np.ndarray] = {}
+        self._hands: Dict[tuple, float] = {}
+
+    def _decide(self, hard: int, aces: int, pair: bool, upcard: int, can_double: bool,
+                can_split: bool) -> PlayerMove:
+        total = _total(hard, aces)
+        if pair:
+            cls = ACE_PAIR if aces else PAIR
+        else:
+            cls = SOFT if total != hard else HARD
+        return self._moves[table_index(cls, total, upcard, can_double, can_split, self._bucket)]
+
+    def dealer_outcomes(self, composition: Composition, upcard: int) -> np.ndarray:
+        """Probability of every dealer outcome together with no dealer blackjack, for a dealer
+        drawing from `composition`"""
+        key = (composition, upcard)
+        outcomes = self._dealer.get(key)
+        if outcomes is not None:
+            return outcomes
+
+        counts, lengths, finals, orders = _dealer_sequences(upcard)
+        left = np.array(composition, dtype=np.float64)
+        # falling factorials: ways to take k cards of a rank, and k cards of the whole shoe, in order
+        taken = np.arange(counts.max())
+        ways = np.cumprod(np.maximum(left[:, None] - taken, 0), axis=1)
+        ways = np.hstack([np.ones((len(RANKS), 1)), ways])
+        shoe = np.cumprod(np.maximum(left.sum() - np.arange(lengths.max()), 0))
+        shoe = np.concatenate([[1.0], shoe])
+
+        sequences = orders * ways[np.arange(len(RANKS)), counts].prod(axis=1)
+        probabilities = np.divide(sequences, shoe[lengths], out=np.zeros(len(sequences)), where=shoe[lengths] > 0)
+        outcomes = np.bincount(finals, probabilities, minlength=OUTCOMES)
+        self._dealer[key] = outcomes
+        return outcomes
+
+    def dealer_probabilities(self, upcard: int) -> Tuple[float, ...]:
+        """Final total distribution (17 - 21, bust) for `upcard`, given the dealer has no blackjack"""
+        composition = list(self.composition)
+        composition[upcard - 2] -= 1
+        outcomes = self.dealer_outcomes(tuple(composition), upcard)
+        return tuple(float(p) for p in outcomes / outcomes.sum())
+
+    @staticmethod
+    def _no_blackjack(composition: Composition, upcard: int) -> float:
+        rank = _blackjack_rank(upcard)
+        if rank is None:
+            return 1.0
+        return 1 - composition[rank] / sum(composition)
+
+    @staticmethod
+    def _draws(composition: Composition):
+        n = sum(composition)
+        for rank, left in enumerate(composition):
+            if left:
+                rest = list(composition)
+                rest[rank] -= 1
+                yield RANKS[rank], left / n, tuple(rest)
+
+    # values below are expected points together with no dealer blackjack, the dealer draws after the player
+
+    def _stand(self, composition: Composition, upcard: int, hard: int, aces: int, cards: int,
+               doubled: bool, fourteen: bool) -> float:
+        total = _total(hard, aces)
+        # the soft 14 against a 6 rule of resolve_game needs an ace in the final hand
+        fourteen = fourteen and aces > 0
+        if total > 21:
+            # the dealer does not draw, and its two cards never beat a busted total
+            return (2 if fourteen else -2 if doubled else -1) * self._no_blackjack(composition, upcard)
+        return float(np.dot(self.dealer_outcomes(composition, upcard), _stand_payouts(total, cards, doubled, fourteen)))
+
+    def _hit(self, composition: Composition, upcard: int, hard: int, aces: int, cards: int, fourteen: bool) -> float:
+        key = ('hit', composition, upcard, hard, aces, cards, fourteen)
+        ev = self._hands.get(key)
+        if ev is not None:
+            return ev
+
+        ev = 0.0
+        for value, p, rest in self._draws(composition):
+            h, a, n = hard + (1 if value == 11 else value), aces + (value == 11), cards + 1
+            if _total(h, a) > 21 or n == CHARLIE_CARDS:
+                ev += p * self._stand(rest, upcard, h, a, n, False, fourteen)
+                continue
+            move = self._decide(h, a, False, upcard, can_double=False, can_split=False)
+            if move == PlayerMove.HIT:
+                ev += p * self._hit(rest, upcard, h, a, n, fourteen)
+            else:
+                # a double after a hit ends the hand without another card
+                ev += p * self._stand(rest, upcard, h, a, n, move == PlayerMove.DOUBLE, fourteen)
+        self._hands[key] = ev
+        return ev
+
+    def _double(self, composition: Composition, upcard: int, hard: int, aces: int, fourteen: bool) -> float:
+        return sum(
+            p * self._stand(rest, upcard, hard + (1 if value == 11 else value), aces + (value == 11), 3, True, fourteen)
+            for value, p, rest in self._draws(composition)
+        )
+
+    def _split_stand(self, composition: Composition, upcard: int, hard: int, aces: int, cards: int,
+                     doubled: bool) -> float:
+        total = _total(hard, aces)
+        if total > 21:
+            # a busted split hand costs 1 point, doubled or not
+            return -self._no_blackjack(composition, upcard)
+        return float(np.dot(self.dealer_outcomes(composition, upcard), _split_payouts(total, cards, doubled)))
+
+    def _split_play(self, composition: Composition, upcard: int, hard: int, aces: int, cards: int,
+                    pair: bool) -> float:
+        key = ('split', composition, upcard, hard, aces, cards, pair)
+        ev = self._hands.get(key)
+        if ev is not None:
+            return ev
+
+        if _total(hard, aces) > 21:
+            ev = self._split_stand(composition, upcard, hard, aces, cards, False)
+        else:
+            move = self._decide(hard, aces, pair, upcard, can_double=cards == 2, can_split=False)
+            if move == PlayerMove.STAY:
+                ev = self._split_stand(composition, upcard, hard, aces, cards, False)
+            else:
+                ev = 0.0
+                for value, p, rest in self._draws(composition):
+                    h, a = hard + (1 if value == 11 else value), aces + (value == 11)
+                    if move == PlayerMove.DOUBLE:
+                        ev += p * self._split_stand(rest, upcard, h, a, cards + 1, True)
+                    else:
+                        ev += p * self._split_play(rest, upcard, h, a, cards + 1, False)
+        self._hands[key] = ev
+        return ev
+
+    def _split(self, composition: Composition, upcard: int, value: int) -> float:
+        # points add up hand by hand, and each hand sees the same cards on average, so both hands are worth the same
+        hard, aces = (1, 1) if value == 11 else (value, 0)
+        ev = 0.0
+        for second, p, rest in self._draws(composition):
+            h, a = hard + (1 if second == 11 else second), aces + (second == 11)
+            if value == 11:
+                # split aces get one card each
+                ev += p * self._split_stand(rest, upcard, h, a, 2, False)
+            else:
+                ev += p * self._split_play(rest, upcard, h, a, 2, second == value)
+        return 2 * ev
+
+    def hand_ev(self, first: int, second: int, upcard: int, composition: Optional[Composition] = None) -> float:
+        """Expected points of a game starting with player cards `first`, `second` and the dealer showing `upcard`,
+        dealt from `composition` (the engine's composition by default)"""
+        left = list(composition or self.composition)
+        for value in (first, second, upcard):
+            left[value - 2] -= 1
+        if min(left) < 0:
+            raise ValueError(f"Cards {first}, {second}, {upcard} are not in the shoe")
+        left = tuple(left)
+
+        rank = _blackjack_rank(upcard)
+        dealer_blackjack = left[rank] / sum(left) if rank is not None else 0.0
+        hard = (1 if first == 11 else first) + (1 if second == 11 else second)
+        aces = (first == 11) + (second == 11)
+        total = _total(hard, aces)
+
+        if first == second == 11:
+            return -dealer_blackjack + self._split(left, upcard, 11)
+        if total == 21:
+            return (1 - dealer_blackjack) * BLACKJACK_PAYOUT
+        if first != second and not aces and ((total == 16 and upcard >= 9) or (total == 15 and upcard == 10)):
+            return -dealer_blackjack + (1 - dealer_blackjack) * SURRENDER_PAYOUT
+
+        fourteen = total == 14 and upcard == 6
+        move = self._decide(hard, aces, first == second, upcard, can_double=True, can_split=True)
+        if move == PlayerMove.HIT:
+            ev = self._hit(left, upcard, hard, aces, 2, fourteen)
+        elif move == PlayerMove.DOUBLE:
+            ev = self._double(left, upcard, hard, aces, fourteen)
+        elif move == PlayerMove.SPLIT:
+            ev = self._split(left, upcard, first)
+        else:
+            ev = self._stand(left, upcard, hard, aces, 2, False, fourteen)
+        return -dealer_blackjack + ev
+
+    def starting_hands(self) -> List[Tuple[int, int, int, float]]:
+        """(first, second, upcard, probability) for every deal, the player's cards in ascending order"""
+        hands = []
+        for upcard, p_up, after_up in self._draws(self.composition):
+            for first, p_first, after_first in self._draws(after_up):
+                for second, p_second, _ in self._draws(after_first):
+                    if second >= first:
+                        p = p_up * p_first * p_second * (1 if first == second else 2)
+                        hands.append((first, second, upcard, p))
+        return hands
+
+    def round_ev(self) -> float:
+        """Expected points of the next game dealt from the composition"""
+        return sum(p * self.hand_ev(first, second, upcard) for first, second, upcard, p in self.starting_hands())
+
+    def ev_table(self) -> Dict[Tuple[int, int], List[float]]:
+        """Expected points per starting hand, one value per dealer upcard 2 - 11"""
+        table = {}
+        for first, second, upcard, _ in self.starting_hands():
+            table.setdefault((first, second), [0.0] * len(RANKS))[upcard - 2] = self.hand_ev(first, second, upcard)
+        return dict(sorted(table.items()))
+
+
+def verify(decks: int = MAX_DECK_PER_SERIES, n_shoes: int = 1_000_000, seed: int = 0,
+           batch: int = 100_000) -> Tuple[float, float, float]:
+    """Exact EV of the first game of a shoe against the vectorized engine playing the first game of
+    `n_shoes` shoes, both at a true count of 0. Returns the exact EV, the simulated EV and its standard error"""
+    from vectorized import deal_shoes, play_shoes, MAX_PAYOUT
+
+    rng = np.random.default_rng(seed)
+    payouts = np.zeros(2 * MAX_PAYOUT + 1, dtype=np.int64)
+    for start in range(0, n_shoes, batch):
+        # one card dealt means one game per shoe. the count of the cards dealt in the game would move the index
+        # plays away from the true count 0 the exact EV plays at, so nothing is counted
+        counts, _ = play_shoes(deal_shoes(min(batch, n_shoes - start), rng, decks), max_cards=1, count_system='none')
+        payouts += counts
+
+    points = (np.arange(len(payouts)) - MAX_PAYOUT) / 2
+    games = payouts.sum()
+    mean = float((payouts * points).sum() / games)
+    variance = float((payouts * (points - mean) ** 2).sum() / (games - 1))
+    return ExactEV(shoe_composition(decks)).round_ev(), mean, (variance / games) ** 0.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact expected value per starting hand")
+    parser.add_argument("--decks", type=int, default=MAX_DECK_PER_SERIES)
+    parser.add_argument("--true-count", type=float, default=0.0, help="true count the strategy plays at")
+    parser.add_argument("--verify", action="store_true", help="compare with a simulation of first games")
+    parser.add_argument("--shoes", type=int, default=1_000_000, help="shoes simulated by --verify")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.verify:
+        exact, simulated, error = verify(args.decks, args.shoes, args.seed)
+        ok = abs(exact - simulated) <= 4 * error
+        print(f"exact {exact:+.5f} simulated {simulated:+.5f} ± {error:.5f}")
+        print("Exact EV OK" if ok else "Exact EV mismatch")
+        exit(0 if ok else 1)
+
+    start = time.perf_counter()
+    engine = ExactEV(shoe_composition(args.decks), args.true_count)
+    table = engine.ev_table()
+    ev = engine.round_ev()
+    elapsed = time.perf_counter() - start
+
+    upcards = ''.join(f"{'A' if value == 11 else value:>8}" for value in RANKS)
+    print(f"{'dealer':<8}{upcards}")
+    for index, total in enumerate(DEALER_TOTALS + ('bust',)):
+        row = ''.join(f"{engine.dealer_probabilities(value)[index]:>8.4f}" for value in RANKS)
+        print(f"{total:<8}{row}")
+    print()
+    print(f"{'hand':<8}{upcards}")
+    for (first, second), values in table.items():
+        name = '-'.join('A' if value == 11 else str(value) for value in (first, second))
+        print(f"{name:<8}" + ''.join(f"{value:>+8.3f}" for value in values))
+    print(f"\nEV {ev:+.5f} points per game at true count {args.true_count:g} ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import struct
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from enums import PlayerMove
+
+MAX_RECORDED_MOVES = 8  # per hand, later moves are dropped
+MAX_EXPORT_HANDS = 4  # hands a record holds, the most any rules preset splits into; unused ones are 0
+EXPORT_BUFFER_ROWS = 65_536
+
+# one fixed width record per game, payouts in the table's payout units (half points unless the blackjack payout
+# needs finer ones, see stats.PayoutCounts) so 1.5 and -0.5 stay integers
+RECORD_DTYPE = np.dtype([
+    ('game', '<u8'),
+    ('shoe', '<u4'),
+    ('true_count', '<f4'),
+    ('bet_count', '<f4'),  # the true count the bet was placed at, before the game's first card
+    ('player_totals', 'u1', (MAX_EXPORT_HANDS,)),
+    ('dealer_total', 'u1'),
+    ('payout', '<i2'),
+    ('moves', 'u1', (MAX_EXPORT_HANDS, MAX_RECORDED_MOVES)),
+])
+
+_MAGIC = b'BJEXPORT'
+_VERSION = 4
+_HEADER = struct.Struct('<8sIII')  # magic, version, record size, payout units a point
+HEADER_SIZE = 64
+
+
+def encode_moves(moves: Sequence[PlayerMove]) -> List[int]:
+    codes = [move.value for move in moves[:MAX_RECORDED_MOVES]]
+    return codes + [0] * (MAX_RECORDED_MOVES - len(codes))
+
+
+class RecordWriter:
+    """Appends export records to a binary file, `buffer_rows` records at a time.
+
+    With an `offset` from `tell`, an existing file is cut back to that point and appended to, so a resumed run
+    drops the records written after its checkpoint.
+    """
+
+    def __init__(self, path: str, buffer_rows: int = EXPORT_BUFFER_ROWS, offset: Optional[int] = None,
+                 units: int = 2):
+        self.path = path
+        self._buffer = np.zeros(buffer_rows, dtype=RECORD_DTYPE)
+        self._size = 0
+        if offset is None:
+            self._file = open(path, 'wb')
+            self._file.write(_HEADER.pack(_MAGIC, _VERSION, RECORD_DTYPE.itemsize, units).ljust(HEADER_SIZE, b'\0'))
+        else:
+            self._file = open(path, 'r+b')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+    def append(self, game: int, shoe: int, true_count: float, bet_count: float, player_totals: Sequence[int],
+               dealer_total: int, moves: Sequence[Sequence[PlayerMove]], payout: int):
+        if len(player_totals) > MAX_EXPORT_HANDS:
+            # the payout would be written without the hands it came from
+            raise ValueError(f"game {game} has {len(player_totals)} hands, an export record holds {MAX_EXPORT_HANDS}")
+        totals = list(player_totals) + [0] * (MAX_EXPORT_HANDS - len(player_totals))
+        codes = [encode_moves(hand_moves) for hand_moves in moves]
+        codes += [[0] * MAX_RECORDED_MOVES] * (MAX_EXPORT_HANDS - len(codes))
+
+        self._buffer[self._size] = (game, shoe, true_count, bet_count, totals, dealer_total, payout, codes)
+        self._size += 1
+        if self._size == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        if self._size:
+            self._file.write(self._buffer[:self._size].tobytes())
+            self._size = 0
+        self._file.flush()
+
+    def tell(self) -> int:
+        # bytes written, every appended record included
+        self.flush()
+        return self._file.tell()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def payout_units(path: str) -> int:
+    """Payout units a point of an export file, a record's payout divided by this is its points"""
+    with open(path, 'rb') as f:
+        magic, version, itemsize, units = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC or version != _VERSION or itemsize != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {_VERSION} export file")
+    return units
+
+
+def read_records(path: str) -> np.memmap:
+    """Memory maps an export file, records are only read from disk when they are accessed"""
+    payout_units(path)  # raises on anything but a current export file
+
+    # a partial record left by a crash is ignored
+    rows = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(rows,))
+
+
+def payout_histogram(records: np.ndarray, units: int = 2, chunk_rows: int = 10_000_000) -> dict:
+    """Payout (in points) -> games, computed in chunks so large files are never fully loaded"""
+    offset = 1 << 15  # every int16 payout has a bin
+    counts = np.zeros(2 * offset, dtype=np.int64)
+    for start in range(0, len(records), chunk_rows):
+        counts += np.bincount(records['payout'][start:start + chunk_rows].astype(np.int64) + offset,
+                              minlength=2 * offset)
+    return {(int(index) - offset) / units: int(counts[index]) for index in np.nonzero(counts)[0]}
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'export.bin'
+    records = read_records(path)
+    print(f"{len(records)} records")
+    for payout, games in payout_histogram(records, payout_units(path)).items():
+        print(f"{payout:>5} {games}")
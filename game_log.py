@@ -0,0 +1,105 @@
+import atexit
+import logging
+import queue
+import threading
+from typing import List, Optional
+
+from config import LOG_FILE, LOG_BUFFER_SIZE, LOG_BATCH_SIZE
+
+# levels are the standard logging ones: per-card chatter is DEBUG, results and count summaries are INFO
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+DISABLED = logging.CRITICAL + 1
+
+
+class BufferedLog:
+    """
+    Collects log lines in memory and hands them in batches to a writer thread.
+    Messages below the level are dropped before their arguments are formatted.
+    An error in the writer is raised by the next flush or by stop, so a failed log stops the run.
+    """
+
+    def __init__(self):
+        self.level = DISABLED
+        self._lines: List[str] = []
+        self._batch_size = LOG_BATCH_SIZE
+        self._batches: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    def start(self, path: str = LOG_FILE, level: int = DEBUG,
+              buffer_size: int = LOG_BUFFER_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        self.stop()
+        self._batch_size = batch_size
+        self._error = None
+        # the game loop waits for the writer once `buffer_size` lines are pending
+        self._batches = queue.Queue(maxsize=max(1, buffer_size // batch_size))
+        self._writer = threading.Thread(target=self._write, args=(path, self._batches), daemon=True)
+        self._writer.start()
+        self.level = level
+
+    def stop(self):
+        """Writes everything still buffered, safe to call more than once"""
+        if self._writer is None:
+            return
+        self.level = DISABLED
+        if self._error is None:
+            self._flush()
+        self._batches.put(None)
+        self._writer.join()
+        self._writer = None
+        self._batches = None
+        # lines left after a failed write are dropped with the log
+        self._lines = []
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        self._lines.append(message % args if args else message)
+        if len(self._lines) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._error is not None:
+            self.stop()
+        if self._lines:
+            self._batches.put(self._lines)
+            self._lines = []
+
+    def _write(self, path: str, batches: queue.Queue):
+        try:
+            with open(path, "a", encoding="utf-8") as logger:
+                while True:
+                    lines = batches.get()
+                    if lines is None:
+                        return
+                    logger.write("\n".join(lines))
+                    logger.write("\n")
+                    logger.flush()
+        except Exception as error:
+            self._error = error
+        # keeps taking batches until stop, so the game loop never waits on a full queue
+        while batches.get() is not None:
+            pass
+
+
+game_log = BufferedLog()
+atexit.register(game_log.stop)
+
+
+def start_logging(path: str = LOG_FILE, level: int = DEBUG,
+                  buffer_size: int = LOG_BUFFER_SIZE, batch_size: int = LOG_BATCH_SIZE):
+    game_log.start(path, level, buffer_size, batch_size)
+
+
+def stop_logging():
+    game_log.stop()
+
+
+__all__ = ["game_log", "start_logging", "stop_logging", "DEBUG", "INFO"]
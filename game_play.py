@@ -1,188 +1,298 @@
 import os
-import math
+import time
+import random
+import argparse
+from typing import List, Optional, Sequence, Tuple
 from models import Player, Dealer, PlayerMove, Hand
-from config import INTERACTIVE, Colors, MAX_GAMES, EXPORT_FILE
+from dataclasses import replace, fields
+from config import Colors
+from settings import GameConfig, add_config_arguments, configs_from_args
 
-from util import get_player_move, print_table
+from util import print_table, TABLE_FILE
+from export import RecordWriter, MAX_EXPORT_HANDS
+from rng import make_rng
+from strategy_table import Strategy, load_strategy
+from game_log import game_log, start_logging, stop_logging, DEBUG, INFO
+from render import Renderer, ConsoleRenderer
+from stats import Aggregator, PayoutCounts, PairedStats, starting_hand, print_stats, STATS_FILE
+from profiling import Profiler
+from shuffles import make_shuffle
+from checkpoint import snapshot, restore, save_checkpoint, load_checkpoint
 
-if INTERACTIVE:
-    MAX_GAMES = 20
+# configs played on the same shoes must agree on these, anything else may differ between the tables
+SAME_SHOE_FIELDS = ('decks', 'rng', 'shuffle')
 
 
 class Blackjack:
-    def __init__(self):
-        self.player = Player("Player 1")
-        self.dealer = Dealer()
+    def __init__(self, config: Optional[GameConfig] = None, rng=None, renderer: Optional[Renderer] = None,
+                 strategy: Optional[Strategy] = None):
+        self.config = config = config or GameConfig()
+        # a renderer is only attached when a human is watching
+        self.renderer = renderer or (ConsoleRenderer() if config.interactive else None)
+        # nothing is rendered or logged, so the hand loop skips all presentation work
+        self.headless = True
+        if rng is None:
+            # of the configured kind, seeded or not
+            rng = make_rng(config.seed, config.rng)
+        # every shuffle and id comes from `rng`, so a seeded rng replays the same run. ids are drawn from a stream
+        # of their own, seeded by one draw, so a seed deals the same shoes whatever the number of seats
+        ids = random.Random(rng.random())
+        self.rules = config.rules
+        self.players = [Player(f"Player {seat + 1}", ids, config.rules) for seat in range(config.seats)]
+        self.dealer = Dealer(rng, config.decks, config.max_cards, config.count_system, config.deck_resolution,
+                             make_shuffle(config.shuffle), ids)
         self.game = 0
-        self.results = {}
+        self.results = PayoutCounts.for_rules(config.rules)
+        self.seat_results = [PayoutCounts.for_rules(config.rules) for _ in self.players]
+        self.stats = Aggregator(config.target_error)
+        self.starting_hands = []
         self.hands_played = 0
-        self.running_count = 0
-
-    @staticmethod
-    def log(message: str, color: str = Colors.BLUE):
-        if INTERACTIVE:
-            print(f"{color}{message}")
-            with open("./log.txt", "a+", encoding="utf-8") as logger:
-                logger.write(message)
-                logger.write("\n")
-
-    def run(self):
-        while self.game < MAX_GAMES:
-            self.__play()
-            self.running_count = 0
-            self.hands_played = 0
-            self.dealer.shuffle()
-        print_table(self.results, self.game)
+        self.shoe = 0
+        self.deal_true_count = 0
+        self.bet_true_count = 0  # before the game's first card, what a bet can be sized on
+        self.strategy = strategy or load_strategy(config.strategies[0])
+        self.player_move = self.strategy.move
+        state = load_checkpoint(config.checkpoint_file) if config.resume else None
+        self.exporter: Optional[RecordWriter] = None
+        if config.export_file and not config.interactive:
+            if config.rules.max_hands > MAX_EXPORT_HANDS:
+                raise ValueError(f"the export holds {MAX_EXPORT_HANDS} hands a game, "
+                                 f"rules allow {config.rules.max_hands}")
+            offset = state['export_offset'] if state else None
+            self.exporter = RecordWriter(config.export_file, offset=offset, units=self.results.units)
+        if state:
+            restore(self, state)
+        self.profiler: Optional[Profiler] = None
+        if config.profile or config.profile_window:
+            self.profiler = Profiler(config.profile_window, config.profile_file).attach(self)
+
+    def log(self, message: str, *args, color: str = Colors.BLUE, level: int = INFO):
+        # arguments are only formatted when the message is rendered or its level is logged
+        if self.headless:
+            return
+        if self.renderer:
+            self.renderer.show(message % args if args else message, color)
+        game_log.log(level, message, *args)
+
+    def run(self, table_file: str = TABLE_FILE, stats_file: str = STATS_FILE):
+        try:
+            self.simulate()
+        finally:
+            self.close()
+        print_table(self.results.as_results(), self.seat_games, table_file)
+        print_stats(self.stats, stats_file)
+
+    def close(self):
+        if self.exporter:
+            self.exporter.close()
+        if self.profiler:
+            self.profiler.finish()
+
+    def simulate(self) -> PayoutCounts:
+        reported = checkpointed = time.perf_counter()
+        # stops early once the EV is known to `target_error`
+        while self.game < self.config.max_games and not self.stats.converged:
+            self.play_shoe()
+            if self.config.checkpoint and time.perf_counter() - checkpointed >= self.config.checkpoint:
+                checkpointed = time.perf_counter()
+                self.checkpoint()
+            if self.config.progress and time.perf_counter() - reported >= self.config.progress:
+                reported = time.perf_counter()
+                print(self.stats.progress(self.config.max_games * len(self.players)), flush=True)
+        if self.config.checkpoint:
+            # a finished run can still be resumed with more games or a tighter target
+            self.checkpoint()
+        return self.results
+
+    def checkpoint(self):
+        # only taken between shoes, where the shoe, the count and the results all agree
+        save_checkpoint(snapshot(self), self.config.checkpoint_file)
+
+    def play_shoe(self):
+        self.shoe += 1
+        self.headless = self.renderer is None and not game_log.is_enabled(INFO)
+        self.__play()
+        self.hands_played = 0
+        self.dealer.shuffle()
 
     def __play(self):
         while not self.dealer.deck.should_create_new_deck():
             self.game += 1
-            self.dealer.start_new_game(self.player)
-            self.hands_played += 2  # 2 hands played each time a new game starts
-            if self.player.hand(0).has_ace and self.player.hand(0).has_pairs:
-                self.hands_played += 1
-                self.handle_ace_split()
-            elif self.player.blackjack or self.dealer.blackjack:
-                self.log("Blackjack! - Someone has a blackjack")
-                self.player.set_move(0, PlayerMove.STAY)
-            # !Checking if player surrendered
-            elif self.player_surrendered():
-                self.log("Surrender - Player loses 0.5 points")
-                self.player.set_move(0, PlayerMove.SURRENDER)
-            else:
-                player_move = get_player_move(
-                    player_hand=self.player.hand(0),
-                    dealer_card=self.dealer.show_card,
-                    true_count=self.get_true_count(),
-                    can_split=True
-                )
-                self.player.set_move(0, player_move)
-                if self.player.last_move == PlayerMove.DOUBLE:
-                    self.log("Double Down - Player receives maximum 1 card")
-                    self.dealer.deal(self.player, 0)
-                elif self.player.last_move == PlayerMove.HIT:
-                    while self.player.last_move == PlayerMove.HIT:
-                        self.log("Hit - Player receives another card")
-                        self.dealer.deal(self.player, 0)
-                        if self.player.charlie(0):
-                            self.log("Player has a charlie - player wins")
-                            break
-                        player_move = get_player_move(
-                            player_hand=self.player.hand(0),
-                            dealer_card=self.dealer.show_card,
-                            true_count=self.get_true_count(),
-                            can_split=False
-                        )
-                        self.player.set_move(0, player_move)
-                elif self.player.last_move == PlayerMove.SPLIT:
-                    self.hands_played += 1
-                    self.log("Split - Player hand splits")
-                    self.handle_player_split()
+            self.bet_true_count = self.get_true_count()
+            self.dealer.start_new_game(self.players)
+            self.deal_true_count = self.get_true_count()
+            self.starting_hands = [starting_hand(player.hand(0)) for player in self.players]
+            self.hands_played += len(self.players) + 1  # every seat and the dealer start a hand each game
+            for player in self.players:
+                self.play_seat(player)
 
             previous_count = self.running_count
             self.log("----------------------------------------")
-            self.running_count = self.running_count + self.resolve_game()
-            self.log("----------------------------------------")
-            self.log(f"Previous Count {previous_count}")
-            self.log(f"Running Count {self.running_count}")
-            self.log(f"Hands Played {self.hands_played}")
-            self.log(f"True Count {self.get_true_count()}")
-            self.log(f"Deck {math.ceil(len(self.dealer.deck.cards) / 52)}")
-            self.log("----------------------------------------")
-            if INTERACTIVE:
-                # input("Press Enter to continue... >>> ")
-                if os.name == 'nt':
-                    os.system('cls')
-                else:
-                    os.system('clear')
+            self.resolve_game()
+            if not self.headless:
+                self.log("----------------------------------------")
+                self.log("Previous Count %s", previous_count)
+                self.log("Running Count %s", self.running_count)
+                self.log("Hands Played %s", self.hands_played)
+                self.log("True Count %s", self.get_true_count())
+                self.log("Deck %s", self.dealer.counter.decks_remaining)
+                self.log("----------------------------------------")
+            if self.renderer:
+                self.renderer.game_over()
 
-    def get_true_count(self):
-        num_decks_remaining = math.ceil(len(self.dealer.deck.cards) / 52)
-        if num_decks_remaining == 0 or self.game == 1:
-            return 0
-        return self.running_count / num_decks_remaining
+    def play_seat(self, player: Player):
+        if len(self.players) > 1:
+            self.log("%s", player.name, level=DEBUG)
+        if player.hand(0).has_ace and player.hand(0).has_pairs:
+            self.hands_played += 1
+            self.handle_ace_split(player)
+        elif player.blackjack or self.dealer.blackjack:
+            self.log("Blackjack! - Someone has a blackjack")
+            player.set_move(0, PlayerMove.STAY)
+        # !Checking if player surrendered
+        elif self.player_surrendered(player):
+            self.log("Surrender - Player loses 0.5 points")
+            player.set_move(0, PlayerMove.SURRENDER)
+        else:
+            player_move = self.player_move(
+                player_hand=player.hand(0),
+                dealer_card=self.dealer.show_card,
+                true_count=self.get_true_count(),
+                can_split=True
+            )
+            player.set_move(0, player_move)
+            if player.last_move == PlayerMove.DOUBLE:
+                self.log("Double Down - Player receives maximum 1 card", level=DEBUG)
+                self.dealer.deal(player, 0)
+            elif player.last_move == PlayerMove.HIT:
+                while player.last_move == PlayerMove.HIT:
+                    self.log("Hit - Player receives another card", level=DEBUG)
+                    self.dealer.deal(player, 0)
+                    if player.charlie(0):
+                        self.log("Player has a charlie - player wins")
+                        break
+                    player_move = self.player_move(
+                        player_hand=player.hand(0),
+                        dealer_card=self.dealer.show_card,
+                        true_count=self.get_true_count(),
+                        can_split=False
+                    )
+                    player.set_move(0, player_move)
+            elif player.last_move == PlayerMove.SPLIT:
+                self.hands_played += 1
+                self.log("Split - Player hand splits", level=DEBUG)
+                self.handle_player_split(player)
+
+    @property
+    def running_count(self) -> int:
+        return self.dealer.counter.running_count
+
+    def get_true_count(self) -> float:
+        # the count follows every card as it is seen, so decisions during a hand use the cards already dealt
+        return self.dealer.counter.true_count
 
-    def handle_player_split(self):
-        for hand_id in range(len(self.player.hands)):
-            self.dealer.deal(self.player, hand_id)
+    def handle_player_split(self, player: Player):
+        hand_id = 0
+        # a resplit adds a hand that is played after the ones before it
+        while hand_id < len(player.hands):
+            self.dealer.deal(player, hand_id)
             while True:
-                player_move = get_player_move(
-                    player_hand=self.player.hand(hand_id),
+                player_move = self.player_move(
+                    player_hand=player.hand(hand_id),
                     dealer_card=self.dealer.show_card,
-                    true_count=self.get_true_count()
+                    true_count=self.get_true_count(),
+                    can_split=player.can_split
                 )
-                self.log(f"Player hand {player_move.name.lower()} split")
-                self.player.set_move(hand_id, player_move)
+                self.log("Player hand %s split", player_move.name.lower(), level=DEBUG)
+                player.set_move(hand_id, player_move)
 
                 if player_move in (PlayerMove.STAY, PlayerMove.SURRENDER):
                     self.log(
                         "Surrender - Player loses 0.5 points"
                         if player_move == PlayerMove.SURRENDER
-                        else "Player Stand."
+                        else "Player Stand.",
+                        level=DEBUG
                     )
                     break
 
-                self.dealer.deal(self.player, hand_id)
+                self.dealer.deal(player, hand_id)
                 if player_move == PlayerMove.DOUBLE:
-                    self.log("Double Down - Player receives maximum 1 card")
+                    self.log("Double Down - Player receives maximum 1 card", level=DEBUG)
                     break
+            hand_id += 1
 
-    def player_surrendered(self):
-        if self.player.hand(0).has_pairs or self.player.hand(0).has_ace:
+    def player_surrendered(self, player: Player):
+        if player.hand(0).has_pairs or player.hand(0).has_ace:
             return False
 
-        surrendered = (
-                (self.player.hand(0) == 16 and self.dealer.show_card == 10) or
-                (self.player.hand(0) == 16 and self.dealer.show_card >= 9) or
-                (self.player.hand(0) == 15 and self.dealer.show_card == 10)
-        )
-        return surrendered
+        return self.rules.surrenders(player.hand(0), self.dealer.show_card.value)
 
-    def handle_ace_split(self):
-        self.log("Ace split")
-        self.player.set_move(0, PlayerMove.SPLIT)
-        self.player.split()
-        self.dealer.deal(self.player, 0)
-        self.dealer.deal(self.player, 1)
+    def handle_ace_split(self, player: Player):
+        self.log("Ace split", level=DEBUG)
+        player.set_move(0, PlayerMove.SPLIT)
+        player.split()
+        self.dealer.deal(player, 0)
+        self.dealer.deal(player, 1)
 
-    def is_player_busted(self):
-        for hand in self.player.hands:
+    def is_player_busted(self, player: Player):
+        for hand in player.hands:
             if not hand.is_busted:
                 return False
         return True
 
-    def all_player_hands_surrendered(self):
-        for hand in self.player.hands:
+    def all_player_hands_surrendered(self, player: Player):
+        for hand in player.hands:
             if not hand.surrendered:
                 return False
         return True
 
     def dealer_move(self):
-        self.log("Moving for dealer")
-        dealer_take_cards = (
-                not self.is_player_busted() and
-                not self.all_player_hands_surrendered() and
-                not self.player.blackjack and
-                not self.dealer.blackjack
+        self.log("Moving for dealer", level=DEBUG)
+        self.dealer.reveal_hole()
+        # the dealer plays once for the whole table, if any seat still has a hand to beat
+        dealer_take_cards = not self.dealer.blackjack and any(
+            not self.is_player_busted(player) and
+            not self.all_player_hands_surrendered(player) and
+            not player.blackjack
+            for player in self.players
         )
 
         if dealer_take_cards:
-            while self.dealer.hand_total < 17:
-                self.log("Taking cards for dealer")
+            while self.rules.dealer_hits(self.dealer.hand):
+                self.log("Taking cards for dealer", level=DEBUG)
                 self.dealer.deal()
 
-    def update_results(self, key: str):
-        if not INTERACTIVE:
-            with open(EXPORT_FILE, "a+") as f:
-                f.write(f"{key}\n")
+    def update_results(self, points: float, seat: int = 0):
+        player = self.players[seat]
+        if self.exporter:
+            # seats of a game share its game number and are written in seat order
+            self.exporter.append(
+                self.game,
+                self.shoe,
+                self.deal_true_count,
+                self.bet_true_count,
+                [hand.total for hand in player.hands],
+                self.dealer.hand_total,
+                [hand.moves for hand in player.hands],
+                round(points * self.results.units)  # the export keeps the table's payout units
+            )
 
-        if self.results.get(key) is None:
-            self.results[key] = 1
-        else:
-            self.results[key] += 1
+        index = self.results.index(points)
+        self.results.counts[index] += 1
+        self.seat_results[seat].counts[index] += 1
+        self.stats.add(points, self.deal_true_count, self.starting_hands[seat])
+
+    @property
+    def player(self) -> Player:
+        return self.players[0]
+
+    @property
+    def seat_games(self) -> int:
+        # every seat plays each game
+        return self.game * len(self.players)
 
     def get_hand_point(self, hand: Hand) -> int:
-        if hand.charlie():
+        if hand.charlie(self.rules.charlie_cards):
             return 1
         if hand == self.dealer.hand_total:
             return 0
@@ -204,116 +314,236 @@ class Blackjack:
                 return 1
 
     def resolve_game(self):
-        card_count = 0
-
         self.dealer_move()
-        self.log(f"Dealer Hand: \n\t {self.dealer.hand}")
-        card_count = card_count + sum([card.count for card in self.dealer.hand.cards])
-        self.log("Player hands: ")
-        for hand in self.player.hands:
-            self.log(f"\t {hand}")
-            card_count = card_count + sum([card.count for card in hand.cards])
-
-        if self.player.blackjack or self.dealer.blackjack:
-            if self.player.blackjack and self.dealer.blackjack:
-                self.log("Push - Player Points = 0", Colors.WARNING)
-                self.update_results("0")
+        if not self.headless:
+            self.log("Dealer Hand: \n\t %s", self.dealer.hand, level=DEBUG)
+            self.log("Player hands: ", level=DEBUG)
+            for player in self.players:
+                for hand in player.hands:
+                    self.log("\t %s", hand, level=DEBUG)
+
+        for seat, player in enumerate(self.players):
+            self.resolve_seat(seat, player)
+
+    def resolve_seat(self, seat: int, player: Player):
+        if len(self.players) > 1:
+            self.log("%s", player.name)
+        if player.blackjack or self.dealer.blackjack:
+            if player.blackjack and self.dealer.blackjack:
+                self.log("Push - Player Points = 0", color=Colors.WARNING)
+                self.update_results(0, seat)
             elif self.dealer.blackjack:
-                self.log("Dealer wins - Player Points = -1", Colors.FAIL)
-                self.update_results("-1")
+                self.log("Dealer wins - Player Points = -1", color=Colors.FAIL)
+                self.update_results(-1, seat)
             else:
-                self.log("Player wins - Player Points = +1.5", Colors.GREEN)
-                self.update_results("1.5")
-        elif len(self.player.hands) == 1:
-            hand = self.player.hand(0)
+                self.log("Player wins - Player Points = +%g", self.rules.blackjack_payout, color=Colors.GREEN)
+                self.update_results(self.rules.blackjack_payout, seat)
+        elif len(player.hands) == 1:
+            hand = player.hand(0)
 
             _hand = Hand([hand.cards[0], hand.cards[1]])
 
             if hand.has_ace and _hand.total == 14 and self.dealer.hand.cards[0].value == 6 \
                     and self.dealer.hand_total != hand.total:
                 if self.dealer.hand_total > hand.total:
-                    self.log("Player loses -2 points", Colors.FAIL)
-                    self.update_results("-2")
+                    self.log("Player loses -2 points", color=Colors.FAIL)
+                    self.update_results(-2, seat)
                 else:
-                    self.log("Player Wins +1 point", Colors.GREEN)
-                    self.update_results("2")
-            elif hand.charlie():
-                self.log("Charlie - Player wins +1 point", Colors.GREEN)
-                self.update_results("1")
+                    self.log("Player Wins +1 point", color=Colors.GREEN)
+                    self.update_results(2, seat)
+            elif hand.charlie(self.rules.charlie_cards):
+                self.log("Charlie - Player wins +1 point", color=Colors.GREEN)
+                self.update_results(1, seat)
             elif hand.is_busted:
                 if hand.double_down:
-                    self.log("Busted - Player loses -2 point", Colors.FAIL)
-                    self.update_results("-2")
+                    self.log("Busted - Player loses -2 point", color=Colors.FAIL)
+                    self.update_results(-2, seat)
                 else:
-                    self.log("Busted - Player loses -1 point", Colors.FAIL)
-                    self.update_results("-1")
+                    self.log("Busted - Player loses -1 point", color=Colors.FAIL)
+                    self.update_results(-1, seat)
             elif hand.surrendered:
-                self.log("Surrender - Player loses -0.5 points", Colors.FAIL)
-                self.update_results("-0.5")
+                self.log("Surrender - Player loses -0.5 points", color=Colors.FAIL)
+                self.update_results(-0.5, seat)
             elif self.dealer.is_busted:
                 if hand.double_down:
-                    self.log("Dealer busted - Player wins +2 point", Colors.GREEN)
-                    self.update_results("2")
+                    self.log("Dealer busted - Player wins +2 point", color=Colors.GREEN)
+                    self.update_results(2, seat)
                 else:
-                    self.log("Dealer busted - Player wins +1 point", Colors.GREEN)
-                    self.update_results("1")
+                    self.log("Dealer busted - Player wins +1 point", color=Colors.GREEN)
+                    self.update_results(1, seat)
             elif hand == self.dealer.hand_total:
-                self.log("Push - Player draws (0 points)", Colors.WARNING)
-                self.update_results("0")
+                self.log("Push - Player draws (0 points)", color=Colors.WARNING)
+                self.update_results(0, seat)
             elif hand < self.dealer.hand_total:
                 if hand.double_down:
-                    self.log("Double Down - Player loses -2 points", Colors.FAIL)
-                    self.update_results("-2")
+                    self.log("Double Down - Player loses -2 points", color=Colors.FAIL)
+                    self.update_results(-2, seat)
                 else:
-                    self.log("Dealer wins - Player loses -1 point", Colors.FAIL)
-                    self.update_results("-1")
+                    self.log("Dealer wins - Player loses -1 point", color=Colors.FAIL)
+                    self.update_results(-1, seat)
             elif hand > self.dealer.hand_total:
                 if hand.double_down:
-                    self.log("Double Down - Player wins +2 points", Colors.GREEN)
-                    self.update_results("2")
+                    self.log("Double Down - Player wins +2 points", color=Colors.GREEN)
+                    self.update_results(2, seat)
                 else:
-                    self.log("Dealer loss - Player wins +1 point", Colors.GREEN)
-                    self.update_results("1")
+                    self.log("Dealer loss - Player wins +1 point", color=Colors.GREEN)
+                    self.update_results(1, seat)
             else:
-                self.log("Should never happen", Colors.FAIL)
+                self.log("Should never happen", color=Colors.FAIL)
                 raise Exception("Should never happen")
         else:
-            # player has 2 hands
-            if all(hand.is_busted for hand in self.player.hands):
-                # both hands busted then we subtract 2 points
-                self.log("Split hands Busted - Player loses -2 points", Colors.FAIL)
-                self.update_results("-2")
-            elif any(hand.is_busted for hand in self.player.hands):
-                # one hand busted then we subtract at least 1 point
-                point = -1
-                for hand in self.player.hands:
-                    if not hand.is_busted:
-                        point = point + self.get_hand_point(hand)
-                self.log(f"Player {point} points", Colors.FAIL)
-                self.update_results(str(point))
+            # player has split hands
+            if all(hand.is_busted for hand in player.hands):
+                # every hand busted then we subtract a point a hand
+                self.log("Split hands Busted - Player loses -%s points", len(player.hands), color=Colors.FAIL)
+                self.update_results(-len(player.hands), seat)
+            elif any(hand.is_busted for hand in player.hands):
+                # a busted hand loses 1 point
+                point = 0
+                for hand in player.hands:
+                    point += -1 if hand.is_busted else self.get_hand_point(hand)
+                self.log("Player %s points", point, color=Colors.FAIL)
+                self.update_results(point, seat)
             else:
-                point = sum(
-                    [self.get_hand_point(self.player.hand(0)),
-                     self.get_hand_point(self.player.hand(1))]
-                )
+                point = sum(self.get_hand_point(hand) for hand in player.hands)
                 self.log(
-                    f"Player {point} points",
-                    Colors.FAIL if point < 0 else
+                    "Player %s points", point,
+                    color=Colors.FAIL if point < 0 else
                     (Colors.WARNING if point == 0 else Colors.GREEN)
                 )
-                self.update_results(str(point))
+                self.update_results(point, seat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blackjack simulation")
+    add_config_arguments(parser)
+    parser.add_argument("--compare", action="store_true",
+                        help="play every config of the sweep on the same shoes, paired against the first")
+    args = parser.parse_args()
+    configs = configs_from_args(args)
+    if args.compare:
+        try:
+            check_same_shoes(configs)
+        except ValueError as error:
+            parser.error(str(error))
+    sweep = len(configs) > 1
+    # configs in a group are played on the same shoes, every strategy of a config at its own table
+    groups = [configs] if args.compare else [[config] for config in configs]
+
+    for index, group in enumerate(groups):
+        config = group[0]
+        if sweep and config.export_file:
+            config = replace(config, export_file=numbered_path(config.export_file, index))
+        if sweep:
+            config = replace(config, checkpoint_file=numbered_path(config.checkpoint_file, index))
+        if config.log_level != 'off':
+            if not config.resume:
+                open(config.log_file, "w").close()
+            start_logging(config.log_file, DEBUG if config.log_level == 'debug' else INFO)
+
+        table_file = numbered_path(TABLE_FILE, index) if len(groups) > 1 else TABLE_FILE
+        stats_file = numbered_path(STATS_FILE, index) if len(groups) > 1 else STATS_FILE
+        variants = [(member, name) for member in group for name in member.strategies]
+        if len(variants) > 1:
+            try:
+                tables, paired = play_same_shoes([(member, load_strategy(name)) for member, name in variants])
+            finally:
+                stop_logging()
+            labels = variant_labels(variants)
+            for position, bj in enumerate(tables):
+                print_table(bj.results.as_results(), bj.seat_games, numbered_path(table_file, position))
+                print_stats(bj.stats, numbered_path(stats_file, position))
+                print(f"{labels[position]}: EV {bj.stats.total.mean:+.4f} "
+                      f"± {bj.stats.total.confidence_interval():.4f} over {bj.seat_games} games")
+            for label, pair in zip(labels[1:], paired):
+                print(f"{label} - {labels[0]}: {pair.difference:+.4f} ± {pair.confidence_interval():.4f} "
+                      f"over {pair.shoes} shoes, {pair.variance_reduction:.1f}x fewer hands than unpaired")
+            continue
+
+        bj = Blackjack(config)
+        try:
+            bj.run(table_file, stats_file)
+        finally:
+            stop_logging()
+        print(f"{config.label}: EV {bj.stats.total.mean:+.4f} ± {bj.stats.total.confidence_interval():.4f} "
+              f"over {bj.seat_games} games")
+        if bj.profiler:
+            print(bj.profiler.report())
+        if len(bj.players) > 1:
+            for player, results in zip(bj.players, bj.seat_results):
+                print(f"  {player.name}: EV {results.mean:+.4f} over {results.games} games")
+
+
+def check_same_shoes(configs: Sequence[GameConfig]):
+    """Raises unless the configs deal the same shoes from the same seed"""
+    differing = [name for name in SAME_SHOE_FIELDS
+                 if len({getattr(config, name) for config in configs}) > 1]
+    if differing:
+        raise ValueError(f"tables played on the same shoes need the same {', '.join(SAME_SHOE_FIELDS)}, "
+                         f"the sweep varies {', '.join(differing)}")
+
+
+def play_same_shoes(variants: Sequence[Tuple[GameConfig, Strategy]]) -> Tuple[List[Blackjack], List[PairedStats]]:
+    """Plays each config and strategy at its own table, every table dealt the same shoes (common random numbers).
+
+    Every table's rng starts from the same seed and, once the table is set up, only shuffles, so shoe n is the
+    same cards at every table whatever its seats, rules or strategy draw from it. Returns the tables, and for every
+    table after the first its EV difference to the first, paired shoe by shoe.
+    """
+    check_same_shoes([config for config, _ in variants])
+    first = variants[0][0]
+    seed = first.seed if first.seed is not None else random.randrange(2 ** 32)
+    tables = [
+        Blackjack(replace(config, seed=seed, interactive=False, export_file=None, checkpoint=0, resume=False),
+                  strategy=strategy)
+        for config, strategy in variants
+    ]
+    paired = [PairedStats() for _ in tables[1:]]
+    points = [0.0] * len(tables)
+    games = [0] * len(tables)
+    try:
+        # every table plays every shoe, so the shoes stay in step until all tables are done
+        while any(table.game < table.config.max_games and not table.stats.converged for table in tables):
+            for table in tables:
+                table.play_shoe()
+            shoe = []
+            for position, table in enumerate(tables):
+                total = table.stats.total
+                shoe.append((total.n * total.mean - points[position], total.n - games[position]))
+                points[position], games[position] = total.n * total.mean, total.n
+            for pair, (shoe_points, shoe_games) in zip(paired, shoe[1:]):
+                pair.add(shoe_points, shoe_games, *shoe[0])
+    finally:
+        for table in tables:
+            table.close()
+    return tables, paired
+
+
+def play_strategies(config: GameConfig, strategies: Optional[Sequence[Strategy]] = None) -> List[Blackjack]:
+    """Plays each strategy at its own table, every table dealt the same shoes"""
+    strategies = strategies or [load_strategy(name) for name in config.strategies]
+    return play_same_shoes([(config, strategy) for strategy in strategies])[0]
+
+
+def variant_labels(variants: Sequence[Tuple[GameConfig, str]]) -> List[str]:
+    # only what sets the variants apart, the config label when nothing does
+    names = [field.name for field in fields(GameConfig)
+             if field.name not in ('strategies', 'export_file', 'checkpoint_file')
+             and len({repr(getattr(config, field.name)) for config, _ in variants}) > 1]
+    labels = [' '.join(f"{name}={getattr(config, name)}" for name in names) for config, _ in variants]
+    if len({strategy for _, strategy in variants}) > 1:
+        labels = [f"{label} strategy={strategy}".strip() for label, (_, strategy) in zip(labels, variants)]
+    return [label or config.label for label, (config, _) in zip(labels, variants)]
+
 
-        return card_count
+def numbered_path(path: str, index: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index}{ext}"
 
 
 if __name__ == '__main__':
     try:
-        open(EXPORT_FILE, 'w').close()
-        open("./log.txt", "w").close()
-        for _ in range(1):
-            bj = Blackjack()
-            bj.run()
-            print(" ")
+        main()
     except KeyboardInterrupt:
         print("Exiting...")
         exit()
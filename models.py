@@ -1,17 +1,26 @@
 import string
-from typing import List, Optional
-from random import shuffle, choices
+from typing import Callable, List, Optional, Tuple, Union
+import random
+from array import array
 from config import *
 from enums import PlayerMove
+from counting import ShoeCounter, DEFAULT_COUNT_SYSTEM, DECK_RESOLUTION
+from rules import TableRules, DEFAULT_RULES
+from rng import make_rng, rng_kind
 import warnings
 
 
 class PlayingCard:
+    __slots__ = ('name', 'suit', 'count', 'value')
+
     def __init__(self, name: str, suit: str, count: int = 0):
-        self.name = name
-        self.suit = suit
-        self.count = count
-        self.value = self._determine_value()
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'suit', suit)
+        object.__setattr__(self, 'count', count)
+        object.__setattr__(self, 'value', self._determine_value())
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"PlayingCard is immutable, cannot set `{key}`")
 
     def _determine_value(self) -> int:
         if self.name == 'A':
@@ -59,29 +68,110 @@ class PlayingCard:
         return PlayingCard(self.name, suit or self.suit)
 
 
+# every card of a single pack, built once. shoes only hold indexes into this table
+PLAYING_CARDS: Tuple[PlayingCard, ...] = tuple(
+    PlayingCard(face, suit, count=count) for face, count in card_values for suit in SUITS
+)
+_CARD_INDEX = {(card.name, card.suit): index for index, card in enumerate(PLAYING_CARDS)}
+
+
 class PlayingCardDeck:
-    def __init__(self):
-        self.cards = []
+    def __init__(self, rng=None, decks: int = MAX_DECK_PER_SERIES, max_cards: int = MAX_CARDS_PER_SERIES,
+                 shuffle_model: Optional[Callable[[List[int], object], List[int]]] = None):
+        # any object with random.Random's random, the global random module by default
+        self.rng = rng or random
+        self.decks = decks
+        self.max_cards = max_cards  # cards dealt before the shoe is replaced
+        # reorders the previous shoe, e.g. a shuffles.ShuffleProcedure. a perfect shuffle without one
+        self.shuffle_model = shuffle_model
+        self._shoe_order = tuple(range(len(PLAYING_CARDS))) * decks
+        # the whole shoe stays in place, dealing only moves the cursor
+        self._order: List[int] = list(self._shoe_order)
+        self._cursor = 0
+        # cards before this position are in dealing order, the ones after it are drawn at random when dealt
+        self._fixed = 0
+        self._seed = 0
+        self._draw = self._shoe_stream()
         self.shuffle()
 
+    @property
+    def cards(self) -> List[PlayingCard]:
+        # cards left in the shoe, in no particular order past the ones already drawn. prefer `cards_remaining`
+        # when only the size is needed
+        return [PLAYING_CARDS[index] for index in self._order[self._cursor:]]
+
+    @cards.setter
+    def cards(self, cards: List[PlayingCard]):
+        # a shoe in a given order, dealt as it is
+        self._order = [_CARD_INDEX[(card.name, card.suit)] for card in cards]
+        self._cursor = 0
+        self._fixed = len(self._order)
+
     def create_card_pack(self):
-        for data in card_values:
-            face, count = data
-            for suit in SUITS:
-                self.cards.append(PlayingCard(face, suit, count=count))
+        self._order.extend(range(len(PLAYING_CARDS)))
 
     def shuffle(self):
-        self.cards = []
-        for _ in range(MAX_DECK_PER_SERIES):
-            self.create_card_pack()
-        shuffle(self.cards)
+        self._cursor = 0
+        if self.shuffle_model:
+            # the previous shoe as it was dealt, then the cards behind the cut card
+            self._order[:] = self.shuffle_model(self._order, self.rng)
+            self._fixed = len(self._order)
+            return
+        # lazy: every card is drawn at random from the undealt ones as it is dealt (a partial Fisher-Yates
+        # shuffle), so the cards left behind the cut card are never shuffled. the index list is reused
+        self._order[:] = self._shoe_order
+        self._fixed = 0
+        # the shoe draws from its own stream, seeded once from `rng`, so a table's rng moves on the same whatever
+        # number of cards its shoes deal, and tables seeded alike keep dealing the same shoes
+        self._seed = int(self.rng.random() * 2 ** 53)
+        self._draw = self._shoe_stream()
+
+    def _shoe_stream(self) -> Callable[[], float]:
+        # of the same kind as the table's rng, so --rng picks the generator that deals the cards
+        return make_rng(self._seed, rng_kind(self.rng)).random
+
+    def getstate(self) -> Tuple[bytes, int, int]:
+        # the shoe order packed two bytes a card, the cursor and the shoe's seed, for checkpoints
+        return array('H', self._order).tobytes(), self._cursor, self._seed
+
+    def setstate(self, state: Tuple[bytes, int, int]):
+        order, self._cursor, self._seed = state
+        self._order[:] = array('H', order)
+        self._draw = self._shoe_stream()
+        if self.shuffle_model:
+            self._fixed = len(self._order)
+            return
+        # every card dealt so far took one draw
+        self._fixed = self._cursor
+        for _ in range(self._cursor):
+            self._draw()
+
+    @property
+    def cards_dealt(self) -> int:
+        return self._cursor
+
+    @property
+    def cards_remaining(self) -> int:
+        return len(self._order) - self._cursor
+
+    @property
+    def decks_remaining(self) -> int:
+        return -(-self.cards_remaining // CARD_COUNT_PER_DECK)
 
     def should_create_new_deck(self) -> bool:
-        total_cards_dealt = (CARD_COUNT_PER_DECK * MAX_DECK_PER_SERIES) - len(self.cards)
-        return total_cards_dealt >= MAX_CARDS_PER_SERIES
+        total_cards_dealt = (CARD_COUNT_PER_DECK * self.decks) - self.cards_remaining
+        return total_cards_dealt >= self.max_cards
 
     def deal(self) -> PlayingCard:
-        return self.cards.pop(0)
+        order = self._order
+        cursor = self._cursor
+        if cursor >= len(order):
+            raise IndexError("deal from empty deck")
+        if cursor >= self._fixed:
+            pick = cursor + int(self._draw() * (len(order) - cursor))
+            order[cursor], order[pick] = order[pick], order[cursor]
+        self._cursor = cursor + 1
+        return PLAYING_CARDS[order[cursor]]
 
 
 class Hand:
@@ -89,29 +179,63 @@ class Hand:
         self.cards: List[PlayingCard] = cards or []  # cards
         self.moves: List[PlayerMove] = []
         self.is_dealer = is_dealer
+        # kept up to date by add_card / pop_card, so the cards never have to be scanned again.
+        # cards must not be changed directly, or the state goes stale
+        self.hard_total = 0  # aces count as 1
+        self.num_aces = 0
+        self.count = 0
+        self._total = 0
+        self._soft = False
+        for card in self.cards:
+            self._track(card, 1)
+        self._update_total()
+
+    def _track(self, card: PlayingCard, sign: int):
+        if card.value == 11:
+            self.hard_total += sign
+            self.num_aces += sign
+        else:
+            self.hard_total += sign * card.value
+        self.count += sign * card.count
+
+    def _update_total(self):
+        # at most one ace can count as 11 without busting the hand
+        self._soft = self.num_aces > 0 and self.hard_total + 10 <= 21
+        self._total = self.hard_total + 10 if self._soft else self.hard_total
 
     def add_cards(self, cards: List[PlayingCard]):
-        self.cards.extend(cards)
+        for card in cards:
+            self.cards.append(card)
+            self._track(card, 1)
+        self._update_total()
         return self
 
     def add_card(self, card: PlayingCard):
         self.cards.append(card)
+        self._track(card, 1)
+        self._update_total()
         return self
 
-    def charlie(self):
-        return len(self.cards) == 7 and self.total <= 21
+    def pop_card(self, index: int = -1) -> PlayingCard:
+        card = self.cards.pop(index)
+        self._track(card, -1)
+        self._update_total()
+        return card
+
+    def charlie(self, cards: int = DEFAULT_RULES.charlie_cards):
+        return len(self.cards) == cards and self._total <= 21
 
     @property
     def has_ace(self) -> bool:
-        return any(card.name == 'A' for card in self.cards)
+        return self.num_aces > 0
 
     @property
     def is_blackjack(self) -> bool:
-        return self.total == 21 and len(self.cards) == 2
+        return self._total == 21 and len(self.cards) == 2
 
     @property
     def is_busted(self) -> bool:
-        return self.total > 21
+        return self._total > 21
 
     @property
     def has_pairs(self) -> bool:
@@ -119,12 +243,7 @@ class Hand:
 
     @property
     def total(self) -> int:
-        total = sum(card.value for card in self.cards)
-        num_aces = sum(1 for card in self.cards if card.name == 'A')
-        while total > 21 and num_aces:
-            total -= 10
-            num_aces -= 1
-        return total
+        return self._total
 
     @property
     def is_flush(self) -> bool:
@@ -163,9 +282,9 @@ class Hand:
 
     def __eq__(self, other):
         if isinstance(other, Hand):
-            return self.total == other.total
+            return self._total == other._total
         elif isinstance(other, int):
-            return self.total == other
+            return self._total == other
         return False
 
     def __ne__(self, other):
@@ -173,49 +292,40 @@ class Hand:
 
     def __lt__(self, other):
         if isinstance(other, Hand):
-            return self.total < other.total
+            return self._total < other._total
         elif isinstance(other, int):
-            return self.total < other
+            return self._total < other
         return False
 
     def __le__(self, other):
         if isinstance(other, Hand):
-            return self.total <= other.total
+            return self._total <= other._total
         elif isinstance(other, int):
-            return self.total <= other
+            return self._total <= other
         return False
 
     def __gt__(self, other):
         if isinstance(other, Hand):
-            return self.total > other.total
+            return self._total > other._total
         elif isinstance(other, int):
-            return self.total > other
+            return self._total > other
         return False
 
     def __ge__(self, other):
         if isinstance(other, Hand):
-            return self.total >= other.total
+            return self._total >= other._total
         elif isinstance(other, int):
-            return self.total >= other
+            return self._total >= other
         return False
 
     def __repr__(self):
-        card_sum = sum([card.count for card in self.cards])
         if self.is_dealer:
-            return f"<Hand(cards={self.cards}, total={self.total}, count={card_sum})/>"
+            return f"<Hand(cards={self.cards}, total={self.total}, count={self.count})/>"
         v = 'soft-hand' if self.has_usable_ace() else 'hard-hand'
-        return f"<Hand(cards={self.cards}, total={self.total}, type={v}, count={card_sum}) />"
+        return f"<Hand(cards={self.cards}, total={self.total}, type={v}, count={self.count}) />"
 
     def has_usable_ace(self):
-        if not self.has_ace:
-            # if no ace in hand then no usable ace
-            return False
-        total = sum(card.value for card in self.cards)
-        num_aces = sum(1 for card in self.cards if card.name == 'A')
-        while total > 21 and num_aces:
-            total -= 10
-            num_aces -= 1
-        return num_aces > 0
+        return self._soft
 
     def __str__(self):
         return self.__repr__()
@@ -225,25 +335,31 @@ class Hand:
 
 
 class Player:
-    def __init__(self, name: string):
-        self._id = "player_" + ''.join(choices(string.ascii_lowercase + string.digits, k=15))
+    def __init__(self, name: string, rng=None, rules: TableRules = DEFAULT_RULES):
+        rng = rng or random
+        self._id = "player_" + ''.join(rng.choices(string.ascii_lowercase + string.digits, k=15))
         self.hands: List[Hand] = [Hand()]
         self.name = name
+        self.rules = rules
 
     def set_move(self, hand_id: int, move: PlayerMove) -> 'Player':
         self.hand(hand_id).moves.append(move)
         if move == PlayerMove.SPLIT:
-            self.split()
+            self.split(hand_id)
         return self
 
-    def split(self) -> 'Player':
-        if len(self.hands) == 2:
-            # cannot split if split before
+    @property
+    def can_split(self) -> bool:
+        return len(self.hands) < self.rules.max_hands
+
+    def split(self, hand_id: int = 0) -> 'Player':
+        if not self.can_split:
+            # cannot split past the table's hand limit
             return self
-        if len(self.hands[0].cards) > 2:
-            # cannot split if not enough cards
+        if len(self.hands[hand_id].cards) != 2:
+            # only a two card hand splits
             return self
-        card = self.hands[0].cards.pop(0)
+        card = self.hands[hand_id].pop_card(0)
         hand = Hand([card])
         hand.moves.append(PlayerMove.SPLIT)
         self.hands.append(hand)
@@ -258,8 +374,8 @@ class Player:
         return self.hands[-1].last_move
 
     def add_card(self, card: PlayingCard, hand_id=0) -> 'Player':
-        # can only split once. player should only have max 2 hands
-        hand_id = min(1, abs(hand_id))
+        # a player only has the hands its splits made
+        hand_id = min(len(self.hands) - 1, abs(hand_id))
         self.hand(hand_id).add_card(card)
         return self
 
@@ -271,7 +387,7 @@ class Player:
         return self.hands[_id]
 
     def charlie(self, hand_id: int = 0) -> bool:
-        return self.hand(hand_id).charlie()
+        return self.hand(hand_id).charlie(self.rules.charlie_cards)
 
     def __str__(self):
         return f"<Player: {self._id} | {self.name} | {self.hands}/>"
@@ -285,15 +401,16 @@ class Player:
 
 
 class Dealer(object):
-    def __init__(self):
-        self._id = "dealer_" + ''.join(choices(string.ascii_lowercase + string.digits, k=15))
+    def __init__(self, rng=None, decks: int = MAX_DECK_PER_SERIES, max_cards: int = MAX_CARDS_PER_SERIES,
+                 count_system: str = DEFAULT_COUNT_SYSTEM, deck_resolution: float = DECK_RESOLUTION,
+                 shuffle_model: Optional[Callable[[List[int], object], List[int]]] = None, id_rng=None):
+        rng = rng or random
+        self._id = "dealer_" + ''.join((id_rng or rng).choices(string.ascii_lowercase + string.digits, k=15))
         self.hand: Hand = Hand()
-        self.__deck__ = PlayingCardDeck()
-
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(cls, 'instance'):
-            cls.instance = super(Dealer, cls).__new__(cls, *args, **kwargs)
-        return cls.instance
+        self.hole_revealed = False
+        self.__deck__ = PlayingCardDeck(rng, decks, max_cards, shuffle_model)
+        # counts every card the table sees, burnt cards and the hole card until it is revealed are not seen
+        self.counter = ShoeCounter(decks, count_system, deck_resolution)
 
     @property
     def dealer_second_card(self):
@@ -320,6 +437,7 @@ class Dealer(object):
 
     def shuffle(self) -> 'Dealer':
         self.deck.shuffle()
+        self.counter.reset()
         return self
 
     @property
@@ -338,24 +456,39 @@ class Dealer(object):
         card = self.deck.deal()
         if player:
             player.add_card(card, player_hand_id)
+            self.counter.see(card.value)
         else:
-            self.add_card(self.deck.deal())
+            dealt = self.deck.deal()
+            self.add_card(dealt)
+            if len(self.hand.cards) != 2:
+                self.counter.see(dealt.value)
         return card.count
 
+    def reveal_hole(self) -> 'Dealer':
+        if not self.hole_revealed and len(self.hand.cards) > 1:
+            self.hole_revealed = True
+            self.counter.see(self.dealer_second_card.value)
+        return self
+
     def reset(self):
         self.hand = Hand(is_dealer=True)
+        self.hole_revealed = False
         return self
 
-    def start_new_game(self, player: Player) -> int:
-        player.reset()
+    def start_new_game(self, players: Union[Player, List[Player]]) -> int:
+        # casino order: one card to every seat left to right, the up card, every seat's second card, the hole card
+        players = [players] if isinstance(players, Player) else players
+        for player in players:
+            player.reset()
         self.reset()
 
-        count = (
-            self.deal()
-            + self.deal(player, 0)
-            + self.deal()
-            + self.deal(player, 0)
-        )
+        count = 0
+        for player in players:
+            count += self.deal(player, 0)
+        count += self.deal()
+        for player in players:
+            count += self.deal(player, 0)
+        count += self.deal()
         return count
 
     def __str__(self):
@@ -369,4 +502,4 @@ class Dealer(object):
         return self.hand.total == 21 and len(self.hand.cards) == 2
 
 
-__all__ = ['Dealer', 'PlayerMove', 'Player', 'Hand', 'PlayingCard', 'PlayingCardDeck']
+__all__ = ['Dealer', 'PlayerMove', 'Player', 'Hand', 'PlayingCard', 'PlayingCardDeck', 'PLAYING_CARDS']
@@ -0,0 +1,108 @@
+import os
+import math
+import time
+import argparse
+from contextlib import nullcontext
+from multiprocessing import Pool
+from typing import List, Tuple
+
+from dataclasses import replace
+
+from game_play import Blackjack, numbered_path
+from settings import GameConfig, add_config_arguments, configs_from_args
+from util import print_table, TABLE_FILE
+from stats import Aggregator, PayoutCounts, print_stats, STATS_FILE
+from rng import spawn_rngs
+
+# shards have a fixed size so the merged results only depend on the master seed, not on the worker count
+GAMES_PER_SHARD = 50_000
+# a run with a target error stops on a shard boundary, smaller shards stop it closer to the target
+TARGET_GAMES_PER_SHARD = 5_000
+
+
+def plan_shards(config: GameConfig, games_per_shard: int = GAMES_PER_SHARD) -> List[Tuple[GameConfig, object]]:
+    if config.target_error:
+        games_per_shard = min(games_per_shard, TARGET_GAMES_PER_SHARD)
+    shards = max(1, math.ceil(config.max_games / games_per_shard))
+    base, extra = divmod(config.max_games, shards)
+    rngs = spawn_rngs(config.seed, shards, config.rng)
+    # a worker's profile would never be reported, and every shard would dump over the same profile file
+    return [
+        (replace(config, max_games=base + (1 if i < extra else 0), interactive=False, export_file=None,
+                 log_level='off', seed=None, checkpoint=0, resume=False, target_error=None, profile=False,
+                 profile_window=None), rngs[i])
+        for i in range(shards)
+    ]
+
+
+def run_shard(shard: Tuple[GameConfig, object]) -> Tuple[PayoutCounts, int, Aggregator]:
+    config, rng = shard
+    # every shard gets its own RNG stream, and a fresh table so no state leaks between shards in a worker
+    bj = Blackjack(config, rng)
+    bj.simulate()
+    return bj.results, bj.seat_games, bj.stats
+
+
+def merge_results(results: List[PayoutCounts]) -> PayoutCounts:
+    merged = PayoutCounts(results[0].units, 0)
+    for result in results:
+        merged.merge(result)
+    return merged
+
+
+def run_parallel(config: GameConfig, workers: int = 0,
+                 games_per_shard: int = GAMES_PER_SHARD) -> Tuple[PayoutCounts, int, Aggregator]:
+    shards = plan_shards(config, games_per_shard)
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    # shards play to their size, the target error is checked on the merged stats. with a target, shards run a
+    # wave of `workers` at a time and the run ends at the first shard, in shard order, that brings the merged EV
+    # to the target, so where it stops does not depend on the worker count
+    wave = workers if config.target_error else len(shards)
+    stats = Aggregator(config.target_error)
+    outcomes = []
+
+    with Pool(workers) if workers > 1 else nullcontext() as pool:
+        # imap keeps shard order, so the merge is reproducible
+        play = pool.imap if pool else map
+        for start in range(0, len(shards), wave):
+            for outcome in play(run_shard, shards[start:start + wave]):
+                outcomes.append(outcome)
+                stats.merge(outcome[2])
+                if stats.converged:
+                    break
+            if stats.converged:
+                break
+
+    results = merge_results([result for result, _, _ in outcomes])
+    games = sum(game for _, game, _ in outcomes)
+    return results, games, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the blackjack simulation across multiple processes")
+    add_config_arguments(parser)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument("--shard-games", type=int, default=GAMES_PER_SHARD)
+    args = parser.parse_args()
+    if args.interactive is None:
+        args.interactive = False
+    configs = configs_from_args(args)
+
+    for index, config in enumerate(configs):
+        start = time.perf_counter()
+        results, games, stats = run_parallel(config, args.workers, args.shard_games)
+        elapsed = time.perf_counter() - start
+
+        sweep = len(configs) > 1
+        print_table(results.as_results(), games, numbered_path(TABLE_FILE, index) if sweep else TABLE_FILE)
+        print_stats(stats, numbered_path(STATS_FILE, index) if sweep else STATS_FILE)
+        print(f"{config.label}: EV {stats.total.mean:+.4f} ± {stats.total.confidence_interval():.4f} over {games} games "
+              f"in {elapsed:.2f}s ({games / elapsed:,.0f} games/sec)")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Exiting...")
+        exit()
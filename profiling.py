@@ -0,0 +1,108 @@
+import time
+import cProfile
+from typing import Callable, Dict, Optional, Tuple
+
+PROFILE_FILE = 'profile.pstats'
+
+# phase -> the attribute timed, on the table (Blackjack) or on its dealer. phases nest, e.g. `card` is also
+# counted inside `deal`, `player` and `dealer`
+TABLE_PHASES = {
+    'deal': ('dealer', 'start_new_game'),
+    'player': ('table', 'play_seat'),
+    'strategy': ('table', 'player_move'),
+    'resolve': ('table', 'resolve_game'),
+    'dealer': ('table', 'dealer_move'),
+    'results': ('table', 'update_results'),
+    'log': ('table', 'log'),
+    'card': ('dealer', 'deal'),
+    'shuffle': ('dealer', 'shuffle'),
+}
+
+
+class Profiler:
+    """Cumulative time and calls per phase of a Blackjack run, and an optional cProfile dump of a window of games.
+
+    Nothing is timed unless a profiler is attached: attaching replaces the timed methods on that one table with
+    timing wrappers, so a table without a profiler runs the plain methods.
+    """
+
+    def __init__(self, window: Optional[Tuple[int, int]] = None, path: str = PROFILE_FILE):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.window = window  # first and last game run under cProfile
+        self.path = path
+        self.table = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._dumped = False
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def _timed(self, phase: str, method: Callable) -> Callable:
+        clock = time.perf_counter
+        seconds = self.seconds
+        calls = self.calls
+        seconds[phase] = 0.0
+        calls[phase] = 0
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[phase] += clock() - start
+                calls[phase] += 1
+
+        return timed
+
+    def attach(self, table) -> 'Profiler':
+        self.table = table
+        owners = {'table': table, 'dealer': table.dealer}
+        for phase, (owner, name) in TABLE_PHASES.items():
+            setattr(owners[owner], name, self._timed(phase, getattr(owners[owner], name)))
+        if table.exporter:
+            table.exporter.append = self._timed('export', table.exporter.append)
+        if self.window:
+            start_new_game = table.dealer.start_new_game
+
+            def windowed(*args, **kwargs):
+                self._window(table.game)
+                return start_new_game(*args, **kwargs)
+
+            table.dealer.start_new_game = windowed
+        self._started = time.perf_counter()
+        return self
+
+    def _window(self, game: int):
+        first, last = self.window
+        if self._dumped:
+            return
+        if game == first and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif game > last:
+            self._dump()
+
+    def _dump(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.path)
+            self._cprofile = None
+            self._dumped = True
+
+    def finish(self):
+        # a run that stops inside the window still dumps what was profiled
+        self._dump()
+        self._elapsed = time.perf_counter() - self._started
+
+    def report(self) -> str:
+        games = self.table.seat_games if self.table else 0
+        lines = [f"{'phase':<10}{'calls':>12}{'seconds':>10}{'µs/call':>10}{'share':>8}"]
+        for phase in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            seconds, calls = self.seconds[phase], self.calls[phase]
+            share = seconds / self._elapsed if self._elapsed else 0
+            lines.append(f"{phase:<10}{calls:>12,}{seconds:>10.3f}{seconds / max(calls, 1) * 1e6:>10.2f}{share:>8.1%}")
+        lines.append(f"{'total':<10}{games:>12,}{self._elapsed:>10.3f}")
+        return '\n'.join(lines)
+
+
+__all__ = ['Profiler', 'PROFILE_FILE']
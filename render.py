@@ -0,0 +1,28 @@
+import os
+
+from config import Colors
+
+
+class Renderer:
+    """Shows a game to a human. Blackjack only calls a renderer when one is attached"""
+
+    def show(self, message: str, color: str = Colors.BLUE):
+        pass
+
+    def game_over(self):
+        pass
+
+
+class ConsoleRenderer(Renderer):
+    def show(self, message: str, color: str = Colors.BLUE):
+        print(f"{color}{message}")
+
+    def game_over(self):
+        # input("Press Enter to continue... >>> ")
+        if os.name == 'nt':
+            os.system('cls')
+        else:
+            os.system('clear')
+
+
+__all__ = ['Renderer', 'ConsoleRenderer']
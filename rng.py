@@ -0,0 +1,54 @@
+import random
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+RNG_KINDS = ('python', 'pcg64')
+Seed = Union[int, np.random.SeedSequence, None]
+
+
+class NumpyRandom:
+    """The part of the random.Random interface the game uses, backed by a NumPy PCG64 generator"""
+
+    def __init__(self, seed: Seed = None):
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+
+    def shuffle(self, x: list):
+        values = np.array(x)
+        self.generator.shuffle(values)
+        x[:] = values.tolist()
+
+    def choices(self, population: Sequence, k: int = 1) -> list:
+        return [population[i] for i in self.generator.integers(0, len(population), size=k)]
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+    def getstate(self) -> dict:
+        return self.generator.bit_generator.state
+
+    def setstate(self, state: dict):
+        self.generator.bit_generator.state = state
+
+
+def make_rng(seed: Seed = None, kind: str = 'python'):
+    if kind not in RNG_KINDS:
+        raise ValueError(f"Unknown rng kind: {kind}")
+    if kind == 'pcg64':
+        return NumpyRandom(seed)
+    if isinstance(seed, np.random.SeedSequence):
+        seed = int.from_bytes(seed.generate_state(4).tobytes(), 'little')
+    return random.Random(seed)
+
+
+def rng_kind(rng) -> str:
+    # the kind make_rng builds for another stream like `rng`
+    return 'pcg64' if isinstance(rng, NumpyRandom) else 'python'
+
+
+def spawn_rngs(seed: Optional[int], n: int, kind: str = 'python') -> list:
+    """Independent child streams for parallel workers, the same for a given seed whatever the worker count"""
+    return [make_rng(child, kind) for child in np.random.SeedSequence(seed).spawn(n)]
+
+
+__all__ = ['NumpyRandom', 'make_rng', 'rng_kind', 'spawn_rngs', 'RNG_KINDS']
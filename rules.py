@@ -0,0 +1,96 @@
+import os
+import json
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, FrozenSet, Tuple, Union
+
+MAX_DEALER_TOTAL = 31  # a dealer hitting 16 ends on at most 26
+DEFAULT_SURRENDER = ((15, 10), (16, 9), (16, 10), (16, 11))
+
+
+@dataclass(frozen=True)
+class TableRules:
+    """House rules of a table, compiled into lookups when created so a hand never interprets them.
+
+    Surrender lists the (player total, dealer card) pairs a hard two card hand surrenders, dealer cards 2 - 11.
+    """
+
+    hit_soft_17: bool = False
+    charlie_cards: int = 7  # a hand of exactly this many cards that has not busted wins, 0 for no charlie
+    surrender: Tuple[Tuple[int, int], ...] = DEFAULT_SURRENDER
+    max_hands: int = 2  # hands a player may split into, 2 is a single split
+    blackjack_payout: float = 1.5
+    name: str = field(default='', compare=False)
+
+    # compiled from the rules above
+    _dealer_hits: Tuple[bool, ...] = field(init=False, repr=False, compare=False)
+    _dealer_hits_soft: Tuple[bool, ...] = field(init=False, repr=False, compare=False)
+    _surrender: FrozenSet[Tuple[int, int]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'surrender', tuple(sorted(tuple(pair) for pair in self.surrender)))
+        if self.charlie_cards < 0:
+            raise ValueError(f"charlie_cards must be at least 0, got {self.charlie_cards}")
+        if self.max_hands < 2:
+            raise ValueError(f"max_hands must be at least 2, got {self.max_hands}")
+        if self.blackjack_payout <= 0:
+            raise ValueError(f"blackjack_payout must be positive, got {self.blackjack_payout}")
+        for total, upcard in self.surrender:
+            if not 2 <= upcard <= 11:
+                raise ValueError(f"surrender dealer cards must be 2 - 11, got {upcard}")
+
+        totals = range(MAX_DEALER_TOTAL + 1)
+        object.__setattr__(self, '_dealer_hits', tuple(total < 17 for total in totals))
+        object.__setattr__(self, '_dealer_hits_soft', tuple(self.hit_soft_17 and total == 17 for total in totals))
+        object.__setattr__(self, '_surrender', frozenset(self.surrender))
+
+    def dealer_hits(self, hand) -> bool:
+        # whether the hand is soft only matters on the totals where a soft hand hits and a hard one stands
+        total = hand.total
+        return self._dealer_hits[total] or (self._dealer_hits_soft[total] and hand.has_usable_ace())
+
+    def surrenders(self, hand, upcard: int) -> bool:
+        return (hand.total, upcard) in self._surrender
+
+    def __str__(self):
+        if self.name:
+            return self.name
+        changed = [f"{rule.name}={getattr(self, rule.name)}" for rule in fields(self)
+                   if rule.init and rule.name != 'name' and getattr(self, rule.name) != getattr(DEFAULT_RULES, rule.name)]
+        return ','.join(changed) or 'default'
+
+
+DEFAULT_RULES = TableRules(name='default')
+
+RULE_PRESETS: Dict[str, TableRules] = {
+    'default': DEFAULT_RULES,
+    'h17': TableRules(hit_soft_17=True, name='h17'),
+    'no-charlie': TableRules(charlie_cards=0, name='no-charlie'),
+    'five-card-charlie': TableRules(charlie_cards=5, name='five-card-charlie'),
+    'no-surrender': TableRules(surrender=(), name='no-surrender'),
+    'resplit-4': TableRules(max_hands=4, name='resplit-4'),
+    'six-to-five': TableRules(blackjack_payout=1.2, name='six-to-five'),
+    'h17-six-to-five': TableRules(hit_soft_17=True, blackjack_payout=1.2, name='h17-six-to-five'),
+}
+
+
+def make_rules(rules: Union[TableRules, str, Dict[str, Any]]) -> TableRules:
+    """Rules from a preset name, a JSON file of TableRules fields or a dict of them"""
+    if isinstance(rules, TableRules):
+        return rules
+    if isinstance(rules, str):
+        if rules in RULE_PRESETS:
+            return RULE_PRESETS[rules]
+        if not os.path.exists(rules):
+            raise ValueError(f"Unknown rules: {rules}, expected a file or one of {', '.join(RULE_PRESETS)}")
+        with open(rules, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        values.setdefault('name', os.path.splitext(os.path.basename(rules))[0])
+        return make_rules(values)
+    known = {rule.name for rule in fields(TableRules) if rule.init}
+    unknown = set(rules) - known
+    if unknown:
+        raise ValueError(f"Unknown rules: {', '.join(sorted(unknown))}")
+    return TableRules(**rules)
+
+
+__all__ = ['TableRules', 'DEFAULT_RULES', 'RULE_PRESETS', 'make_rules']
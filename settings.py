@@ -0,0 +1,193 @@
+import json
+import argparse
+import itertools
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (MAX_GAMES, MAX_DECK_PER_SERIES, MAX_CARDS_PER_SERIES, CARD_COUNT_PER_DECK, INTERACTIVE,
+                    EXPORT_FILE, LOG_FILE, MAXIMUM_PLAYERS, TABLE_SEATS)
+from rng import RNG_KINDS
+from counting import COUNT_SYSTEMS, DEFAULT_COUNT_SYSTEM, DECK_RESOLUTION
+from profiling import PROFILE_FILE
+from checkpoint import CHECKPOINT_FILE
+from strategy_table import BASIC
+from rules import TableRules, DEFAULT_RULES, RULE_PRESETS, make_rules
+from shuffles import SHUFFLE_STEPS, PERFECT, make_shuffle
+
+USE_TOML = True
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    try:
+        # noinspection PyUnresolvedReferences
+        import tomli as tomllib
+    except ModuleNotFoundError:
+        USE_TOML = False
+
+MAX_INTERACTIVE_GAMES = 20  # default game count when a human is watching
+DEFAULT_PENETRATION = MAX_CARDS_PER_SERIES / (CARD_COUNT_PER_DECK * MAX_DECK_PER_SERIES)
+LOG_LEVELS = ('debug', 'info', 'off')
+
+# fields that may hold a list of values, every combination is run
+SWEEP_FIELDS = ('max_games', 'decks', 'penetration', 'seats', 'count_system', 'deck_resolution', 'rules', 'shuffle')
+
+
+@dataclass(frozen=True)
+class GameConfig:
+    max_games: Optional[int] = None  # MAX_INTERACTIVE_GAMES when interactive, MAX_GAMES otherwise
+    decks: int = MAX_DECK_PER_SERIES
+    penetration: float = DEFAULT_PENETRATION  # share of the shoe dealt before a reshuffle
+    seats: int = MAXIMUM_PLAYERS
+    interactive: bool = INTERACTIVE
+    export_file: Optional[str] = EXPORT_FILE
+    log_file: str = LOG_FILE
+    log_level: Optional[str] = None  # debug when interactive, off otherwise
+    seed: Optional[int] = None
+    rng: str = 'python'
+    count_system: str = DEFAULT_COUNT_SYSTEM
+    target_error: Optional[float] = None  # stop once the standard error of the EV is this small
+    progress: float = 0  # seconds between progress lines, 0 for none
+    profile: bool = False  # time every phase of the game loop
+    profile_window: Optional[Tuple[int, int]] = None  # first and last game run under cProfile
+    profile_file: str = PROFILE_FILE
+    deck_resolution: float = DECK_RESOLUTION  # true count divisor rounded up to this many decks, 0 for exact
+    shuffle: str = PERFECT  # or shuffle steps joined by '+', e.g. casino or riffle+riffle+strip+riffle+cut
+    rules: TableRules = DEFAULT_RULES  # a preset name, a JSON file or a dict of TableRules fields are taken too
+    strategies: Tuple[str, ...] = (BASIC,)  # basic or chart files, more than one are played on the same shoes
+    checkpoint: float = 0  # seconds between checkpoints, 0 for none
+    checkpoint_file: str = CHECKPOINT_FILE
+    resume: bool = False  # carry on from checkpoint_file
+
+    def __post_init__(self):
+        if self.max_games is None:
+            object.__setattr__(self, 'max_games', MAX_INTERACTIVE_GAMES if self.interactive else MAX_GAMES)
+        if self.log_level is None:
+            object.__setattr__(self, 'log_level', 'debug' if self.interactive else 'off')
+        if self.decks < 1:
+            raise ValueError(f"decks must be at least 1, got {self.decks}")
+        if not 1 <= self.seats <= TABLE_SEATS:
+            raise ValueError(f"seats must be between 1 and {TABLE_SEATS}, got {self.seats}")
+        if not 0 < self.penetration <= 1:
+            raise ValueError(f"penetration must be in (0, 1], got {self.penetration}")
+        if self.log_level not in LOG_LEVELS:
+            raise ValueError(f"log_level must be one of {LOG_LEVELS}, got {self.log_level}")
+        if self.rng not in RNG_KINDS:
+            raise ValueError(f"rng must be one of {RNG_KINDS}, got {self.rng}")
+        if self.count_system not in COUNT_SYSTEMS:
+            raise ValueError(f"count_system must be one of {tuple(COUNT_SYSTEMS)}, got {self.count_system}")
+        if self.profile_window is not None:
+            object.__setattr__(self, 'profile_window', tuple(self.profile_window))
+            first, last = self.profile_window
+            if not 1 <= first <= last:
+                raise ValueError(f"profile_window must be two games, first <= last, got {self.profile_window}")
+        if self.target_error is not None and self.target_error <= 0:
+            raise ValueError(f"target_error must be positive, got {self.target_error}")
+        if self.deck_resolution < 0:
+            raise ValueError(f"deck_resolution must be at least 0, got {self.deck_resolution}")
+        object.__setattr__(self, 'rules', make_rules(self.rules))
+        make_shuffle(self.shuffle)  # raises on unknown steps
+        if isinstance(self.strategies, str):
+            object.__setattr__(self, 'strategies', (self.strategies,))
+        object.__setattr__(self, 'strategies', tuple(self.strategies))
+        if not self.strategies:
+            raise ValueError("strategies must name at least one strategy")
+        if self.checkpoint < 0:
+            raise ValueError(f"checkpoint must be at least 0, got {self.checkpoint}")
+
+    @property
+    def max_cards(self) -> int:
+        # cards dealt from the shoe before it is reshuffled
+        return round(self.decks * CARD_COUNT_PER_DECK * self.penetration)
+
+    @property
+    def label(self) -> str:
+        label = f"decks={self.decks} penetration={self.penetration:.2f} games={self.max_games}"
+        if self.seats != 1:
+            label += f" seats={self.seats}"
+        if self.count_system != DEFAULT_COUNT_SYSTEM:
+            label += f" count={self.count_system}"
+        if self.deck_resolution != DECK_RESOLUTION:
+            label += f" resolution={self.deck_resolution:g}"
+        if self.shuffle != PERFECT:
+            label += f" shuffle={self.shuffle}"
+        if self.rules != DEFAULT_RULES:
+            label += f" rules={self.rules}"
+        return label
+
+
+def load_config_file(path: str) -> Dict[str, Any]:
+    if path.endswith('.toml'):
+        if not USE_TOML:
+            raise ValueError("TOML config files need Python 3.11+ or the tomli package")
+        with open(path, 'rb') as f:
+            values = tomllib.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+
+    known = {field.name for field in fields(GameConfig)}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"Unknown config keys in {path}: {', '.join(sorted(unknown))}")
+    return values
+
+
+def expand_sweep(values: Dict[str, Any]) -> List[GameConfig]:
+    """One config for every combination of the list valued sweep fields"""
+    base = {key: value for key, value in values.items() if key not in SWEEP_FIELDS}
+    axes = [
+        [(key, value) for value in (values[key] if isinstance(values[key], list) else [values[key]])]
+        for key in SWEEP_FIELDS if key in values
+    ]
+    return [GameConfig(**base, **dict(combination)) for combination in itertools.product(*axes)]
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--config", help="JSON or TOML file with GameConfig fields, arguments take precedence")
+    parser.add_argument("--games", dest="max_games", type=int, nargs="+", help="games to play (sweepable)")
+    parser.add_argument("--decks", type=int, nargs="+", help="decks per shoe (sweepable)")
+    parser.add_argument("--penetration", type=float, nargs="+",
+                        help="share of the shoe dealt before a reshuffle (sweepable)")
+    parser.add_argument("--seats", type=int, nargs="+", help=f"players at the table, 1 - {TABLE_SEATS} (sweepable)")
+    parser.add_argument("--interactive", action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--export-file")
+    parser.add_argument("--log-file")
+    parser.add_argument("--log-level", choices=LOG_LEVELS)
+    parser.add_argument("--seed", type=int, help="seed for a reproducible run")
+    parser.add_argument("--rng", choices=RNG_KINDS, help="random number generator")
+    parser.add_argument("--target-error", type=float, help="stop once the standard error of the EV is below this")
+    parser.add_argument("--progress", type=float, help="print games, EV, hands/sec and ETA every this many seconds")
+    parser.add_argument("--profile", action="store_true", default=None, help="report time spent per phase")
+    parser.add_argument("--profile-window", type=int, nargs=2, metavar=("FIRST", "LAST"),
+                        help="run these games under cProfile and dump the stats to --profile-file")
+    parser.add_argument("--profile-file")
+    parser.add_argument("--count-system", choices=tuple(COUNT_SYSTEMS), nargs="+",
+                        help="card counting system (sweepable)")
+    parser.add_argument("--deck-resolution", type=float, nargs="+",
+                        help="decks left are rounded up to a multiple of this for the true count, 0 for exact "
+                             "(sweepable)")
+    parser.add_argument("--shuffle", nargs="+", metavar="STEPS",
+                        help=f"{PERFECT}, or shuffle steps ({', '.join(SHUFFLE_STEPS)}) joined by '+' and applied "
+                             f"to the previous shoe (sweepable)")
+    parser.add_argument("--rules", nargs="+", metavar="RULES",
+                        help=f"house rules, a preset ({', '.join(RULE_PRESETS)}) or a JSON file (sweepable)")
+    parser.add_argument("--strategy", dest="strategies", nargs="+", metavar="CHART",
+                        help=f"{BASIC} or CSV / JSON chart files, several are played on the same shoes")
+    parser.add_argument("--checkpoint", type=float, metavar="SECONDS",
+                        help="save the run to --checkpoint-file between shoes, at most this often")
+    parser.add_argument("--checkpoint-file")
+    parser.add_argument("--resume", action="store_true", default=None,
+                        help="carry on from --checkpoint-file, appending to the export and log files")
+
+
+def configs_from_args(args: argparse.Namespace) -> List[GameConfig]:
+    values = load_config_file(args.config) if args.config else {}
+    for field in fields(GameConfig):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = value[0] if isinstance(value, list) and len(value) == 1 else value
+    return expand_sweep(values)
+
+
+__all__ = ['GameConfig', 'load_config_file', 'expand_sweep', 'add_config_arguments', 'configs_from_args']
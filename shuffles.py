@@ -0,0 +1,243 @@
+import math
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import CARD_COUNT_PER_DECK, MAX_DECK_PER_SERIES, MAX_CARDS_PER_SERIES
+from models import PlayingCardDeck, PLAYING_CARDS
+from rng import NumpyRandom
+
+SHOES = 20_000
+P_VALUE = 0.001  # a check fails below this
+RANK_VALUES = 12  # card values index 2 - 11, 0 and 1 are never used
+
+PERFECT = 'perfect'  # a uniformly random shoe, drawn lazily by PlayingCardDeck itself
+STRIP_PACKETS = 6
+CUT_SPREAD = 1 / 8  # standard deviation of a cut around the middle, as a share of the cards
+CASINO_GRAB = CARD_COUNT_PER_DECK  # cards taken off each half of the discards at a time
+
+
+# shuffle steps take the cards as an index array and return them in their new order, top card first
+
+def riffle(cards: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Gilbert-Shannon-Reeds riffle: a binomial cut, then every interleaving of the two halves equally likely"""
+    # each card independently lands from the top or the bottom half, which is the GSR model run backwards
+    top = rng.random(len(cards)) < 0.5
+    shuffled = np.empty_like(cards)
+    split = int(top.sum())
+    shuffled[top] = cards[:split]
+    shuffled[~top] = cards[split:]
+    return shuffled
+
+
+def strip(cards: np.ndarray, rng: np.random.Generator, packets: int = STRIP_PACKETS) -> np.ndarray:
+    """Packets pulled off the top one at a time onto a pile, so their order reverses and each stays intact"""
+    packets = min(packets, len(cards))
+    cuts = np.sort(rng.choice(np.arange(1, len(cards)), packets - 1, replace=False))
+    return np.concatenate(np.split(cards, cuts)[::-1])
+
+
+def cut(cards: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    n = len(cards)
+    at = int(np.clip(round(rng.normal(n / 2, n * CUT_SPREAD)), 1, n - 1))
+    return np.concatenate((cards[at:], cards[:at]))
+
+
+def casino(cards: np.ndarray, rng: np.random.Generator, grab: int = CASINO_GRAB) -> np.ndarray:
+    """A multi-deck hand shuffle: the discards are split in two, and a grab from each half at a time is riffled,
+    stripped and riffled again onto the new stack, which is cut at the end"""
+    middle = len(cards) // 2
+    halves = (cards[:middle], cards[middle:])
+    stack = []
+    taken = 0
+    while taken < middle:
+        size = max(1, int(round(rng.normal(grab, grab / 8))))
+        pair = np.concatenate((halves[0][taken:taken + size], halves[1][taken:taken + size]))
+        stack.append(riffle(strip(riffle(pair, rng), rng), rng))
+        taken += size
+    # the bottom half of an odd shoe has a card left over
+    stack.append(halves[1][taken:])
+    return cut(np.concatenate(stack), rng)
+
+
+SHUFFLE_STEPS: Dict[str, Callable[[np.ndarray, np.random.Generator], np.ndarray]] = {
+    'riffle': riffle,
+    'strip': strip,
+    'cut': cut,
+    'casino': casino,
+}
+
+
+class ShuffleProcedure:
+    """Shuffle steps applied in turn to the previous shoe, given as names joined by '+', e.g. riffle+strip+cut.
+
+    A deck with a procedure shuffles its previous order: the cards as they were dealt, then the ones behind the
+    cut card. That is where shuffle tracking looks for clumps that survive the shuffle.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        unknown = [name for name in spec.split('+') if name not in SHUFFLE_STEPS]
+        if unknown:
+            raise ValueError(f"Unknown shuffle steps: {', '.join(unknown)}, expected {', '.join(SHUFFLE_STEPS)}")
+        self.steps = [SHUFFLE_STEPS[name] for name in spec.split('+')]
+
+    def __call__(self, order: List[int], rng) -> List[int]:
+        if isinstance(rng, NumpyRandom):
+            generator = rng.generator
+        else:
+            # one draw from the table's rng seeds the shuffle, so seeded runs and checkpoints replay it
+            generator = np.random.Generator(np.random.PCG64(int(rng.random() * 2 ** 53)))
+        cards = np.array(order, dtype=np.int16)
+        for step in self.steps:
+            cards = step(cards, generator)
+        return cards.tolist()
+
+    def __repr__(self):
+        return f"ShuffleProcedure({self.spec!r})"
+
+
+def make_shuffle(spec: str) -> Optional[ShuffleProcedure]:
+    # None for a perfect shuffle, which PlayingCardDeck draws lazily
+    return None if spec == PERFECT else ShuffleProcedure(spec)
+
+
+# deals one shoe, the card values up to the cut card
+ShoeDealer = Callable[[], List[int]]
+
+
+def chi_square_p(statistic: float, dof: int) -> float:
+    """Chance of a chi-square statistic at least this large, by the Wilson-Hilferty normal approximation, which
+    is close for the hundreds of degrees of freedom the checks here have"""
+    if dof <= 0:
+        return 1.0
+    scale = 2 / (9 * dof)
+    z = ((statistic / dof) ** (1 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _rank_probabilities(decks: int) -> np.ndarray:
+    counts = np.zeros(RANK_VALUES)
+    for card in PLAYING_CARDS:
+        counts[card.value] += decks
+    return counts
+
+
+def deal_values(deal_shoe: ShoeDealer, shoes: int) -> np.ndarray:
+    return np.array([deal_shoe() for _ in range(shoes)], dtype=np.int64)
+
+
+def position_check(values: np.ndarray, decks: int) -> float:
+    """p-value of every position of the shoe holding each rank as often as the shoe's composition says"""
+    shoes, positions = values.shape
+    flat = (np.arange(positions) * RANK_VALUES + values).ravel()
+    observed = np.bincount(flat, minlength=positions * RANK_VALUES).reshape(positions, RANK_VALUES)[:, 2:]
+    counts = _rank_probabilities(decks)[2:]
+    expected = shoes * counts / counts.sum()
+    statistic = float((((observed - expected) ** 2) / expected).sum())
+    return chi_square_p(statistic, positions * (len(counts) - 1))
+
+
+def pair_check(values: np.ndarray, decks: int) -> float:
+    """p-value of neighbouring cards following each other as often as drawing without replacement says"""
+    shoes, positions = values.shape
+    counts = _rank_probabilities(decks)[2:]
+    total = counts.sum()
+    # first card a, then b from what is left
+    expected = np.outer(counts, counts) - np.diag(counts)
+    expected = shoes * expected / (total * (total - 1))
+    ranks = len(counts)
+    statistic = 0.0
+    for position in range(positions - 1):
+        pairs = (values[:, position] - 2) * ranks + values[:, position + 1] - 2
+        observed = np.bincount(pairs, minlength=ranks * ranks).reshape(ranks, ranks)
+        statistic += float((((observed - expected) ** 2) / expected).sum())
+    return chi_square_p(statistic, (positions - 1) * (ranks * ranks - 1))
+
+
+def lazy_shoe(rng, decks: int = MAX_DECK_PER_SERIES, cards: int = MAX_CARDS_PER_SERIES) -> ShoeDealer:
+    deck = PlayingCardDeck(rng, decks, cards)
+
+    def deal_shoe() -> List[int]:
+        deck.shuffle()
+        return [deck.deal().value for _ in range(cards)]
+
+    return deal_shoe
+
+
+def full_shuffle(rng, decks: int = MAX_DECK_PER_SERIES, cards: int = MAX_CARDS_PER_SERIES) -> ShoeDealer:
+    # what PlayingCardDeck did before it drew lazily: the whole shoe shuffled up front
+    shoe = [card.value for card in PLAYING_CARDS] * decks
+
+    def deal_shoe() -> List[int]:
+        order = list(shoe)
+        rng.shuffle(order)
+        return order[:cards]
+
+    return deal_shoe
+
+
+def procedure_shoe(spec: str, rng, decks: int = MAX_DECK_PER_SERIES,
+                   cards: int = MAX_CARDS_PER_SERIES) -> ShoeDealer:
+    # each shoe is shuffled from the one before it, as at a table
+    deck = PlayingCardDeck(rng, decks, cards, make_shuffle(spec))
+
+    def deal_shoe() -> List[int]:
+        deck.shuffle()
+        return [deck.deal().value for _ in range(cards)]
+
+    return deal_shoe
+
+
+def verify(shoes: int = SHOES, seed: int = 0, decks: int = MAX_DECK_PER_SERIES,
+           cards: int = MAX_CARDS_PER_SERIES) -> Dict[str, Dict[str, float]]:
+    """p-values of the position and pair checks, for the lazy shoe and for a full shuffle as the reference"""
+    results = {}
+    for name, make in (('lazy', lazy_shoe), ('full', full_shuffle)):
+        values = deal_values(make(random.Random(seed), decks, cards), shoes)
+        results[name] = {'position': position_check(values, decks), 'pair': pair_check(values, decks)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistical checks of how shoes are shuffled")
+    parser.add_argument("--verify", action="store_true", help="check the lazy shoe deals like a full shuffle")
+    parser.add_argument("--procedure", help=f"check how close a shuffle procedure ({'+'.join(SHUFFLE_STEPS)}) "
+                                            f"comes to a perfect shuffle, and time it")
+    parser.add_argument("--shoes", type=int, default=SHOES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--decks", type=int, default=MAX_DECK_PER_SERIES)
+    args = parser.parse_args()
+
+    if args.procedure:
+        cards = min(MAX_CARDS_PER_SERIES, args.decks * CARD_COUNT_PER_DECK)
+        procedure = ShuffleProcedure(args.procedure)
+        rng = random.Random(args.seed)
+        order = list(range(args.decks * CARD_COUNT_PER_DECK))
+        start = time.perf_counter()
+        for _ in range(1000):
+            order = procedure(order, rng)
+        print(f"{args.procedure}: {(time.perf_counter() - start) * 1000:.1f} µs a shuffle of {len(order)} cards")
+        values = deal_values(procedure_shoe(args.procedure, rng, args.decks, cards), args.shoes)
+        print(f"position p={position_check(values, args.decks):.4g}  pair p={pair_check(values, args.decks):.4g}")
+
+    if args.verify:
+        cards = min(MAX_CARDS_PER_SERIES, args.decks * CARD_COUNT_PER_DECK)
+        results = verify(args.shoes, args.seed, args.decks, cards)
+        failed = False
+        for name, checks in results.items():
+            print(f"{name:<6}" + ''.join(f"{check} p={p:.4f}  " for check, p in checks.items()))
+            failed |= any(p < P_VALUE for p in checks.values())
+        print("Shuffle OK" if not failed else f"Checks below p={P_VALUE}")
+        exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
+
+
+__all__ = ['riffle', 'strip', 'cut', 'casino', 'SHUFFLE_STEPS', 'ShuffleProcedure', 'make_shuffle', 'PERFECT',
+           'chi_square_p', 'position_check', 'pair_check', 'lazy_shoe', 'full_shuffle', 'procedure_shoe', 'verify']
@@ -0,0 +1,270 @@
+import math
+import time
+from fractions import Fraction
+from typing import Dict, Optional
+
+import numpy as np
+
+from models import Hand
+from util import write_table
+
+STATS_FILE = 'stats.txt'
+
+Z_95 = 1.959964  # two sided 95% confidence
+MIN_GAMES = 1_000  # the standard error is not trusted for early stopping before this many games
+
+
+class RunningStats:
+    """Mean and variance in one pass (Welford), mergeable across shards (Chan et al.)"""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        if other.n:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.mean += delta * other.n / n
+            self.n = n
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std_error(self) -> float:
+        return math.sqrt(self.variance / self.n) if self.n > 1 else math.inf
+
+    def confidence_interval(self, z: float = Z_95) -> float:
+        # half width, the interval is mean ± this
+        return z * self.std_error
+
+    def __getstate__(self):
+        return self.n, self.mean, self.m2
+
+    def __setstate__(self, state):
+        self.n, self.mean, self.m2 = state
+
+
+class PayoutCounts:
+    """Games per payout, counted in a fixed list indexed by the payout in units of 1 / `units` points.
+
+    Units are half points, so 1.5 and -0.5 are whole units, unless the blackjack payout needs finer ones (a 6:5
+    table counts tenths). Counts of the same units add up across seats, workers and checkpoints.
+    """
+
+    __slots__ = ('units', 'offset', 'counts')
+
+    def __init__(self, units: int = 2, max_points: int = 4):
+        self.units = units
+        self.offset = units * max_points  # index of a payout of 0
+        self.counts = [0] * (2 * self.offset + 1)
+
+    @classmethod
+    def for_rules(cls, rules) -> 'PayoutCounts':
+        # every payout is a whole number of half points, or of the blackjack payout's fraction; a doubled hand
+        # wins or loses 2 points at most, on each split hand
+        units = math.lcm(2, Fraction(rules.blackjack_payout).limit_denominator(1000).denominator)
+        return cls(units, 2 * rules.max_hands)
+
+    def index(self, points: float) -> int:
+        return round(points * self.units) + self.offset
+
+    def add(self, points: float):
+        self.counts[self.index(points)] += 1
+
+    def merge(self, other: 'PayoutCounts') -> 'PayoutCounts':
+        if other.units != self.units:
+            raise ValueError(f"payouts counted in 1/{other.units} points do not add to 1/{self.units} points")
+        if other.offset > self.offset:
+            pad = [0] * (other.offset - self.offset)
+            self.counts = pad + self.counts + pad
+            self.offset = other.offset
+        shift = self.offset - other.offset
+        for index, count in enumerate(other.counts):
+            self.counts[index + shift] += count
+        return self
+
+    def points(self, index: int) -> float:
+        return (index - self.offset) / self.units
+
+    @property
+    def games(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def mean(self) -> float:
+        games = self.games
+        return sum((index - self.offset) * count for index, count in enumerate(self.counts)) / self.units / games \
+            if games else 0.0
+
+    @property
+    def variance(self) -> float:
+        games = self.games
+        if games < 2:
+            return 0.0
+        mean = self.mean
+        return sum(count * (self.points(index) - mean) ** 2 for index, count in enumerate(self.counts)) / (games - 1)
+
+    def as_results(self) -> Dict[str, int]:
+        """The payout string keys util.print_table reports, e.g. {"1.5": 45, "-1": 480}, in payout order"""
+        return {f"{self.points(index):g}": count for index, count in enumerate(self.counts) if count}
+
+    def __getstate__(self):
+        return self.units, self.offset, self.counts
+
+    def __setstate__(self, state):
+        self.units, self.offset, self.counts = state
+
+
+class PairedStats:
+    """EV difference of two tables dealt the same shoes, paired shoe by shoe.
+
+    Every shoe adds the points and games of table a and table b. Each EV is points over games, and the standard
+    error of their difference comes from the covariance of the four per shoe sums (delta method), so whatever
+    the two tables had in common from the shoe cancels out.
+    """
+
+    def __init__(self):
+        self.shoes = 0
+        self.mean = np.zeros(4)  # points a, games a, points b, games b per shoe
+        self.m2 = np.zeros((4, 4))
+
+    def add(self, points_a: float, games_a: int, points_b: float, games_b: int):
+        x = np.array((points_a, games_a, points_b, games_b), dtype=float)
+        self.shoes += 1
+        delta = x - self.mean
+        self.mean += delta / self.shoes
+        self.m2 += np.outer(delta, x - self.mean)
+
+    @property
+    def difference(self) -> float:
+        points_a, games_a, points_b, games_b = self.mean
+        return (points_a / games_a if games_a else 0.0) - (points_b / games_b if games_b else 0.0)
+
+    def _variance(self, paired: bool) -> float:
+        points_a, games_a, points_b, games_b = self.mean
+        if self.shoes < 2 or not games_a or not games_b:
+            return math.inf
+        gradient = np.array((1 / games_a, -points_a / games_a ** 2, -1 / games_b, points_b / games_b ** 2))
+        covariance = self.m2 / (self.shoes - 1)
+        if not paired:
+            # as if the tables had been dealt independent shoes
+            covariance = covariance.copy()
+            covariance[:2, 2:] = covariance[2:, :2] = 0
+        return float(gradient @ covariance @ gradient) / self.shoes
+
+    @property
+    def std_error(self) -> float:
+        return math.sqrt(self._variance(True))
+
+    def confidence_interval(self, z: float = Z_95) -> float:
+        return z * self.std_error
+
+    @property
+    def variance_reduction(self) -> float:
+        # how many times more hands independent shoes would need for the same standard error
+        paired = self._variance(True)
+        return self._variance(False) / paired if 0 < paired < math.inf else math.nan
+
+
+def starting_hand(hand: Hand) -> str:
+    """Label of a hand's first two cards, e.g. A-7, the same labels exact_ev prints"""
+    values = sorted(card.value for card in hand.cards[:2])
+    return '-'.join('A' if value == 11 else str(value) for value in values)
+
+
+class Aggregator:
+    """Streaming game statistics: the overall EV plus one bucket per true count and per starting hand"""
+
+    def __init__(self, target_error: Optional[float] = None):
+        self.target_error = target_error
+        self.total = RunningStats()
+        self.by_true_count: Dict[int, RunningStats] = {}
+        self.by_hand: Dict[str, RunningStats] = {}
+        self.started = time.perf_counter()
+
+    def add(self, points: float, true_count: float, hand: str):
+        self.total.add(points)
+        bucket = round(true_count)
+        stats = self.by_true_count.get(bucket)
+        if stats is None:
+            stats = self.by_true_count[bucket] = RunningStats()
+        stats.add(points)
+        stats = self.by_hand.get(hand)
+        if stats is None:
+            stats = self.by_hand[hand] = RunningStats()
+        stats.add(points)
+
+    def merge(self, other: 'Aggregator') -> 'Aggregator':
+        self.total.merge(other.total)
+        for mine, theirs in ((self.by_true_count, other.by_true_count), (self.by_hand, other.by_hand)):
+            for key, stats in theirs.items():
+                mine.setdefault(key, RunningStats()).merge(stats)
+        return self
+
+    @property
+    def converged(self) -> bool:
+        return (self.target_error is not None and self.total.n >= MIN_GAMES
+                and self.total.std_error <= self.target_error)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def hands_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.total.n / elapsed if elapsed > 0 else 0.0
+
+    def games_left(self, max_games: int) -> int:
+        left = max(0, max_games - self.total.n)
+        if self.target_error and self.total.n > 1:
+            # the standard error shrinks with the square root of the games played
+            needed = self.total.n * (self.total.std_error / self.target_error) ** 2
+            left = min(left, max(0, math.ceil(needed) - self.total.n))
+        return left
+
+    def progress(self, max_games: int) -> str:
+        rate = self.hands_per_sec
+        eta = self.games_left(max_games) / rate if rate else math.inf
+        return (f"{self.total.n:,} games  EV {self.total.mean:+.4f} ± {self.total.confidence_interval():.4f}  "
+                f"{rate:,.0f} hands/sec  ETA {eta:,.0f}s")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # a timer means nothing in another process
+        state['started'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.started = time.perf_counter()
+
+
+def print_stats(aggregator: Aggregator, path: str = STATS_FILE):
+    headers = ["Bucket", "Games", "EV", "95% CI", "Std dev"]
+    rows = [("all", aggregator.total)]
+    rows += [(f"TC {bucket:+d}", aggregator.by_true_count[bucket]) for bucket in sorted(aggregator.by_true_count)]
+    rows += [(hand, aggregator.by_hand[hand]) for hand in sorted(aggregator.by_hand)]
+    table_data = [
+        [name, f"{stats.n}", f"{stats.mean:+.4f}", f"±{stats.confidence_interval():.4f}", f"{stats.variance ** 0.5:.4f}"]
+        for name, stats in rows
+    ]
+
+    write_table(headers, table_data, path)
+
+
+__all__ = ['RunningStats', 'PayoutCounts', 'PairedStats', 'Aggregator', 'starting_hand', 'print_stats', 'STATS_FILE']
@@ -0,0 +1,364 @@
+import os
+import csv
+import json
+import argparse
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from typing import Protocol
+except ImportError:
+    # typing_extensions ships it for older Pythons
+    from typing_extensions import Protocol
+
+from enums import PlayerMove
+from models import Hand, PlayingCard, PLAYING_CARDS
+from util import get_player_move
+
+# hand classes
+HARD = 0
+SOFT = 1
+PAIR = 2
+ACE_PAIR = 3
+HAND_CLASSES = 4
+
+MAX_TOTAL = 31  # busted totals above this share the last slot
+UPCARDS = 10  # dealer card values 2 - 11
+
+# true count thresholds used by util._get_true_count_play. negative deviations use `<=`,
+# positive ones use `>=`, and a true count of exactly 0 never deviates
+NEGATIVE_BOUNDS = (-4, -2, -1)
+POSITIVE_BOUNDS = (1, 3, 4, 5, 6, 7, 8)
+TC_BUCKETS = len(NEGATIVE_BOUNDS) + len(POSITIVE_BOUNDS) + 3
+ZERO_BUCKET = len(NEGATIVE_BOUNDS) + 1
+# one true count inside every bucket, in bucket order
+TC_SAMPLES = (-4, -2, -1, -0.5, 0, 0.5, 1, 3, 4, 5, 6, 7, 8)
+
+TABLE_SHAPE = (HAND_CLASSES, MAX_TOTAL + 1, UPCARDS, 2, 2, TC_BUCKETS)
+
+BASIC = 'basic'  # name of the built in strategy, util.get_player_move
+
+# chart cells, D and Ds only double on a hand that can still double
+CHART_MOVES = {
+    'H': (PlayerMove.HIT, PlayerMove.HIT),
+    'S': (PlayerMove.STAY, PlayerMove.STAY),
+    'D': (PlayerMove.DOUBLE, PlayerMove.HIT),
+    'Ds': (PlayerMove.DOUBLE, PlayerMove.STAY),
+    'P': (PlayerMove.SPLIT, PlayerMove.SPLIT),
+}
+
+
+def true_count_bucket(true_count: float) -> int:
+    if true_count < 0:
+        return bisect_left(NEGATIVE_BOUNDS, true_count)
+    if true_count == 0:
+        return ZERO_BUCKET
+    return ZERO_BUCKET + 1 + bisect_right(POSITIVE_BOUNDS, true_count)
+
+
+def hand_class(hand: Hand) -> int:
+    if hand.has_pairs:
+        return ACE_PAIR if hand.has_ace else PAIR
+    return SOFT if hand.has_usable_ace() else HARD
+
+
+def table_index(cls: int, total: int, upcard: int, can_double: bool, can_split: bool, bucket: int,
+                buckets: int = TC_BUCKETS) -> int:
+    index = cls * (MAX_TOTAL + 1) + min(total, MAX_TOTAL)
+    index = index * UPCARDS + upcard - 2
+    index = (index * 2 + can_double) * 2 + can_split
+    return index * buckets + bucket
+
+
+def bucket_samples(negative_bounds: Sequence[float], positive_bounds: Sequence[float]) -> Tuple[float, ...]:
+    # one true count inside every bucket the bounds make, TC_SAMPLES for the default bounds
+    below_zero = negative_bounds[-1] / 2 if negative_bounds else -1
+    above_zero = positive_bounds[0] / 2 if positive_bounds else 1
+    return tuple(negative_bounds) + (below_zero, 0, above_zero) + tuple(positive_bounds)
+
+
+class _KeyHand(Hand):
+    """Stand-in hand that only carries the features util.get_player_move looks at"""
+
+    def __init__(self, cls: int, total: int, can_double: bool):
+        super().__init__(is_dealer=False)
+        soft = cls in (SOFT, ACE_PAIR)
+        self.num_aces = 2 if cls == ACE_PAIR else int(soft)
+        self.hard_total = total - 10 if soft else total
+        self._total = total
+        self._soft = soft
+        self._pair = cls in (PAIR, ACE_PAIR)
+        self._can_double = can_double
+
+    @property
+    def has_pairs(self) -> bool:
+        return self._pair
+
+    @property
+    def can_double_down(self):
+        return self._can_double
+
+
+class Strategy(Protocol):
+    """What Blackjack asks for a move, with the arguments of util.get_player_move"""
+
+    name: str
+
+    def move(self, player_hand: Hand, dealer_card: PlayingCard, true_count: float, can_split=False) -> PlayerMove:
+        ...
+
+
+# the move for one decision key: the key hand, its class, the dealer card, can_split and a true count
+Decide = Callable[[_KeyHand, int, PlayingCard, bool, float], Optional[PlayerMove]]
+
+
+def _basic_move(hand: _KeyHand, cls: int, dealer_card: PlayingCard, can_split: bool,
+                true_count: float) -> Optional[PlayerMove]:
+    try:
+        return get_player_move(hand, dealer_card, true_count, can_split)
+    except ValueError:
+        # pairs that cannot exist, e.g. a pair totalling 5
+        return None
+
+
+class StrategyTable:
+    """A strategy evaluated once for every decision key, so a decision is a single index lookup.
+
+    `decide` is util.get_player_move by default. True counts fall in buckets split at the bounds, negative bounds
+    hold for counts `<=` them and positive ones for counts `>=` them.
+    """
+
+    def __init__(self, decide: Decide = _basic_move, name: str = BASIC,
+                 negative_bounds: Sequence[float] = NEGATIVE_BOUNDS, positive_bounds: Sequence[float] = POSITIVE_BOUNDS):
+        self.name = name
+        self.negative_bounds = tuple(negative_bounds)
+        self.positive_bounds = tuple(positive_bounds)
+        self.zero_bucket = len(self.negative_bounds) + 1
+        self.buckets = len(self.negative_bounds) + len(self.positive_bounds) + 3
+        self.moves: Tuple[Optional[PlayerMove], ...] = self._compile(decide)
+
+    def _compile(self, decide: Decide) -> Tuple[Optional[PlayerMove], ...]:
+        upcards = {card.value: card for card in PLAYING_CARDS}
+        samples = bucket_samples(self.negative_bounds, self.positive_bounds)
+        moves = []
+        for cls in range(HAND_CLASSES):
+            for total in range(MAX_TOTAL + 1):
+                for upcard in range(2, 2 + UPCARDS):
+                    for can_double in (False, True):
+                        hand = _KeyHand(cls, total, can_double)
+                        for can_split in (False, True):
+                            for true_count in samples:
+                                moves.append(decide(hand, cls, upcards[upcard], can_split, true_count))
+        return tuple(moves)
+
+    def bucket(self, true_count: float) -> int:
+        if true_count < 0:
+            return bisect_left(self.negative_bounds, true_count)
+        if true_count == 0:
+            return self.zero_bucket
+        return self.zero_bucket + 1 + bisect_right(self.positive_bounds, true_count)
+
+    def lookup(self, player_hand: Hand, dealer_card: PlayingCard, true_count: float, can_split=False) -> PlayerMove:
+        return self.moves[table_index(
+            hand_class(player_hand),
+            player_hand.total,
+            dealer_card.value,
+            player_hand.can_double_down,
+            can_split,
+            self.bucket(true_count),
+            self.buckets
+        )]
+
+    move = lookup
+
+    def differences(self, other: 'StrategyTable') -> int:
+        """Decision keys where the two tables move differently, both sampled at every bucket of either table"""
+        negative = sorted(set(self.negative_bounds) | set(other.negative_bounds))
+        positive = sorted(set(self.positive_bounds) | set(other.positive_bounds))
+        upcards = list({card.value: card for card in PLAYING_CARDS}.values())
+        count = 0
+        for cls in range(HAND_CLASSES):
+            for total in range(MAX_TOTAL + 1):
+                for can_double in (False, True):
+                    hand = _KeyHand(cls, total, can_double)
+                    for dealer_card in upcards:
+                        for can_split in (False, True):
+                            for true_count in bucket_samples(negative, positive):
+                                count += self.lookup(hand, dealer_card, true_count, can_split) != \
+                                    other.lookup(hand, dealer_card, true_count, can_split)
+        return count
+
+    def as_array(self):
+        # PlayerMove values as a dense int8 array of TABLE_SHAPE, 0 for keys that cannot happen
+        import numpy as np
+
+        values = [move.value if move else 0 for move in self.moves]
+        return np.array(values, dtype=np.int8).reshape(TABLE_SHAPE[:-1] + (self.buckets,))
+
+    def verify(self) -> List[str]:
+        """Compares the table with util.get_player_move on every reachable hand, returns the mismatches"""
+        upcards = list({card.value: card for card in PLAYING_CARDS}.values())
+        true_counts = sorted(
+            set(TC_SAMPLES) | {running / decks for running in range(-40, 41) for decks in range(1, 7)}
+        )
+        mismatches = []
+        for hand in _reachable_hands():
+            for doubled in ((False, True) if len(hand) == 2 else (False,)):
+                hand.moves = [PlayerMove.DOUBLE] if doubled else []
+                for dealer_card in upcards:
+                    for true_count in true_counts:
+                        for can_split in (False, True):
+                            expected = get_player_move(hand, dealer_card, true_count, can_split)
+                            actual = self.lookup(hand, dealer_card, true_count, can_split)
+                            if expected != actual:
+                                mismatches.append(
+                                    f"{hand} vs {dealer_card.value} tc={true_count} split={can_split}: "
+                                    f"expected {expected}, table {actual}"
+                                )
+        return mismatches
+
+
+def _reachable_hands() -> List[Hand]:
+    # one hand for every combination of features a decision depends on
+    cards = list({card.value: card for card in PLAYING_CARDS}.values())
+    seen = set()
+    hands = []
+    frontier = [Hand([first, second], is_dealer=False) for first in cards for second in cards]
+    while frontier:
+        hand = frontier.pop()
+        key = (hand.total, hand.has_usable_ace(), hand.has_pairs, hand.has_ace, len(hand) == 2)
+        if key in seen:
+            continue
+        seen.add(key)
+        hands.append(hand)
+        if not hand.is_busted:
+            frontier.extend(Hand(hand.cards + [card], is_dealer=False) for card in cards)
+    return hands
+
+
+@lru_cache(maxsize=None)
+def default_table() -> StrategyTable:
+    return StrategyTable()
+
+
+def lookup_player_move(player_hand: Hand, dealer_card: PlayingCard, true_count: float, can_split=False) -> PlayerMove:
+    return default_table().lookup(player_hand, dealer_card, true_count, can_split)
+
+
+# a chart cell: the move, then index plays tried in order, e.g. "H S>=0" stands on a true count of 0 or more
+Cell = Tuple[str, List[Tuple[str, float, str]]]
+
+
+def _parse_cell(text: str, where: str) -> Cell:
+    move, *deviations = text.split()
+    plays = []
+    for deviation in deviations:
+        for op in ('>=', '<='):
+            code, sep, threshold = deviation.partition(op)
+            if sep:
+                break
+        else:
+            raise ValueError(f"{where}: index play {deviation!r} needs >= or <=")
+        threshold = float(threshold)
+        if (op == '>=' and threshold < 0) or (op == '<=' and threshold > 0):
+            raise ValueError(f"{where}: {deviation!r}, >= plays need a threshold >= 0 and <= plays one <= 0")
+        plays.append((op, threshold, code))
+    for code in [move] + [code for _, _, code in plays]:
+        if code not in CHART_MOVES:
+            raise ValueError(f"{where}: unknown move {code!r}, expected one of {', '.join(CHART_MOVES)}")
+    return move, plays
+
+
+def _parse_upcard(text: str, where: str) -> int:
+    upcard = 11 if text.strip().upper() == 'A' else int(text)
+    if not 2 <= upcard <= 11:
+        raise ValueError(f"{where}: dealer card {text!r} is not 2 - 10 or A")
+    return upcard
+
+
+def compile_chart(rows: Dict[str, Dict[str, str]], name: str) -> StrategyTable:
+    """Compiles a chart into a StrategyTable, cells the chart leaves out play basic strategy.
+
+    Rows are H<total> and S<total> for hard and soft hands and P<card> for pairs (P2 - P10, PA), columns the
+    dealer cards 2 - 10 and A. Pair rows only apply while the hand may split, other pairs play their total.
+    """
+    cells: Dict[Tuple[str, int], Cell] = {}
+    for row, columns in rows.items():
+        row = row.strip().upper()
+        for column, text in columns.items():
+            if text and text.strip():
+                where = f"{name} {row} vs {column}"
+                cells[row, _parse_upcard(column, where)] = _parse_cell(text.strip(), where)
+    negative = {threshold for _, plays in cells.values() for op, threshold, _ in plays if threshold < 0}
+    positive = {threshold for _, plays in cells.values() for op, threshold, _ in plays if threshold > 0}
+
+    def decide(hand: _KeyHand, cls: int, dealer_card: PlayingCard, can_split: bool,
+               true_count: float) -> Optional[PlayerMove]:
+        total = hand.total
+        cell = None
+        if cls in (PAIR, ACE_PAIR) and can_split:
+            cell = cells.get(('PA' if cls == ACE_PAIR else f"P{total // 2}", dealer_card.value))
+        if cell is None:
+            cell = cells.get((f"{'S' if cls in (SOFT, ACE_PAIR) else 'H'}{total}", dealer_card.value))
+        if cell is None:
+            return _basic_move(hand, cls, dealer_card, can_split, true_count)
+        code, plays = cell
+        for op, threshold, play in plays:
+            if (true_count >= threshold) if op == '>=' else (true_count <= threshold):
+                code = play
+                break
+        if code == 'P' and not can_split:
+            return _basic_move(hand, cls, dealer_card, can_split, true_count)
+        can_double_move, move = CHART_MOVES[code]
+        return can_double_move if hand.can_double_down else move
+
+    return StrategyTable(decide, name, sorted(set(NEGATIVE_BOUNDS) | negative),
+                         sorted(set(POSITIVE_BOUNDS) | positive))
+
+
+def load_chart(path: str) -> StrategyTable:
+    """Reads a CSV chart (a header of dealer cards, then one row per hand) or a JSON one ({"chart": {row: {card:
+    cell}}}, with an optional "name")"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            data = json.load(f)
+            return compile_chart(data['chart'], data.get('name', name))
+        header, *lines = [line for line in csv.reader(f) if line and not line[0].startswith('#')]
+    return compile_chart({line[0]: dict(zip(header[1:], line[1:])) for line in lines}, name)
+
+
+def load_strategy(name: str) -> StrategyTable:
+    # `basic`, or a chart file
+    return default_table() if name == BASIC else load_chart(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled strategy lookup table")
+    parser.add_argument("--verify", action="store_true", help="check the table against util.get_player_move")
+    parser.add_argument("--chart", help="compile a CSV or JSON chart and count where it differs from basic strategy")
+    args = parser.parse_args()
+
+    if args.chart:
+        chart = load_chart(args.chart)
+        print(f"{chart.name}: {len(chart.moves)} decisions compiled, {chart.buckets} true count buckets, "
+              f"{chart.differences(default_table())} differ from {BASIC}")
+        return
+
+    table = default_table()
+    print(f"{len(table.moves)} decisions compiled")
+    if args.verify:
+        mismatches = table.verify()
+        for mismatch in mismatches[:20]:
+            print(mismatch)
+        print("Table OK" if not mismatches else f"{len(mismatches)} mismatches")
+        exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
+
+
+__all__ = ["Strategy", "StrategyTable", "default_table", "lookup_player_move", "true_count_bucket", "hand_class",
+           "compile_chart", "load_chart", "load_strategy", "BASIC"]
@@ -3,6 +3,7 @@ from models import Hand, PlayingCard
 from typing import Union, List, Optional
 
 USE_PRETTY_TABLE = True
+TABLE_FILE = 'table.txt'
 
 try:
     # noinspection PyUnresolvedReferences
@@ -156,29 +157,20 @@ def bd_nice_number(num: int, decimals: int = 1):
     return formatted_num
 
 
-def print_table(results: dict, game_total: int):
-    headers = ["Key", f"Wins/{bd_nice_number(game_total)}", "Win%"]
-    table_data = []
-
+def write_table(headers: List[str], table_data: List[List[str]], path: str):
+    """Writes the rows to `path` as a PrettyTable, or as plain columns without prettytable"""
     table: Union[PrettyTable, List] = []
 
     if USE_PRETTY_TABLE:
         table = PrettyTable()
         table.field_names = headers
-
-    for key, value in results.items():
-        data = [key, f"{value}", f"{(value / game_total * 100):.4f}"]
-        table_data.append(data)
-
-    if USE_PRETTY_TABLE:
         table.add_rows(table_data)
-        with open('table.txt', 'w+') as logger:
+        with open(path, 'w+') as logger:
             logger.write(str(table))
-        # print(table)
     else:
         table_data = [headers] + table_data
         col_widths = [max(len(str(item)) for item in col) for col in zip(*table_data)]
-        with open('table.txt', 'a+') as logger:
+        with open(path, 'w+') as logger:
             for row in table_data:
                 logger.write(" | ".join(f"{str(item):<{col_widths[i]}}" for i, item in enumerate(row)))
                 logger.write("\n")
@@ -187,4 +179,10 @@ def print_table(results: dict, game_total: int):
                     logger.write("\n")
 
 
-__all__ = ["get_player_move", "print_table"]
+def print_table(results: dict, game_total: int, path: str = TABLE_FILE):
+    headers = ["Key", f"Wins/{bd_nice_number(game_total)}", "Win%"]
+    table_data = [[key, f"{value}", f"{(value / game_total * 100):.4f}"] for key, value in results.items()]
+    write_table(headers, table_data, path)
+
+
+__all__ = ["get_player_move", "print_table", "write_table"]
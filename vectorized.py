@@ -0,0 +1,417 @@
+import time
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import CARD_COUNT_PER_DECK, MAX_DECK_PER_SERIES, MAX_CARDS_PER_SERIES
+from counting import COUNT_SYSTEMS, DEFAULT_COUNT_SYSTEM, DECK_RESOLUTION
+from enums import PlayerMove
+from models import PlayingCard, PLAYING_CARDS
+from strategy_table import default_table, HARD, SOFT, PAIR, ACE_PAIR, MAX_TOTAL, ZERO_BUCKET, \
+    NEGATIVE_BOUNDS, POSITIVE_BOUNDS
+
+# moves are encoded with the PlayerMove values
+HIT = PlayerMove.HIT.value
+STAY = PlayerMove.STAY.value
+DOUBLE = PlayerMove.DOUBLE.value
+SPLIT = PlayerMove.SPLIT.value
+
+# payouts are kept in half points so 1.5 and -0.5 stay integers
+MAX_PAYOUT = 8
+PAYOUT_BINS = 2 * MAX_PAYOUT + 1
+
+
+# a representative card for every card value (2 - 11)
+CARDS_BY_VALUE: Dict[int, PlayingCard] = {}
+for _card in PLAYING_CARDS:
+    CARDS_BY_VALUE.setdefault(_card.value, _card)
+
+# count tags of every system, indexed by card value
+COUNT_TAGS = {name: np.array((0, 0) + tags, dtype=np.int64) for name, tags in COUNT_SYSTEMS.items()}
+
+# one unshuffled pack, in the same order as PlayingCardDeck builds its shoe
+PACK = np.array([card.value for card in PLAYING_CARDS], dtype=np.int8)
+
+MOVES = default_table().as_array()
+
+
+def deal_shoes(n_shoes: int, rng: Optional[np.random.Generator] = None,
+               decks: int = MAX_DECK_PER_SERIES) -> np.ndarray:
+    rng = rng or np.random.default_rng()
+    shoe = np.tile(PACK, decks)
+    return rng.permuted(np.tile(shoe, (n_shoes, 1)), axis=1)
+
+
+def encode_deck(cards: List[PlayingCard]) -> np.ndarray:
+    return np.array([card.value for card in cards], dtype=np.int8)
+
+
+def hand_total(hard: np.ndarray, aces: np.ndarray) -> np.ndarray:
+    # an ace counts 11 only while it does not bust the hand, so at most one ace is ever "usable"
+    return hard + 10 * ((aces > 0) & (hard + 10 <= 21))
+
+
+def true_count_buckets(tc: np.ndarray) -> np.ndarray:
+    """Array version of strategy_table.true_count_bucket"""
+    negative = np.searchsorted(NEGATIVE_BOUNDS, tc, side='left')
+    positive = ZERO_BUCKET + 1 + np.searchsorted(POSITIVE_BOUNDS, tc, side='right')
+    return np.where(tc < 0, negative, np.where(tc == 0, ZERO_BUCKET, positive))
+
+
+def decide(hard, aces, pair, up, tc, can_double, can_split: bool) -> np.ndarray:
+    """Array version of util.get_player_move, looked up in the compiled strategy table"""
+    total = hand_total(hard, aces)
+    soft = (aces > 0) & (hard + 10 <= 21)
+    cls = np.where(pair, np.where(aces > 0, ACE_PAIR, PAIR), np.where(soft, SOFT, HARD))
+    can_double = np.broadcast_to(can_double, total.shape).astype(np.int64)
+    return MOVES[cls, np.minimum(total, MAX_TOTAL), up - 2, can_double, int(can_split), true_count_buckets(tc)]
+
+
+class _Round:
+    """One game played in lockstep on every shoe that has not reached the penetration cutoff"""
+
+    def __init__(self, shoes: np.ndarray, rows: np.ndarray, cursor: np.ndarray, running_count: np.ndarray,
+                 seen: np.ndarray, tags: np.ndarray, deck_resolution: float):
+        k = len(rows)
+        self.shoes = shoes
+        self.rows = rows
+        self.cursor = cursor[rows]
+        # the count follows every card as it is seen, like counting.ShoeCounter
+        self.running_count = running_count[rows]
+        self.seen = seen[rows]
+        self.tags = tags
+        self.deck_resolution = deck_resolution
+        self.hard = np.zeros((2, k), dtype=np.int64)
+        self.aces = np.zeros((2, k), dtype=np.int64)
+        self.cards = np.zeros((2, k), dtype=np.int64)
+        self.first = np.zeros((2, k), dtype=np.int64)
+        self.second = np.zeros((2, k), dtype=np.int64)
+        self.doubled = np.zeros((2, k), dtype=bool)
+        self.dealer_hard = np.zeros(k, dtype=np.int64)
+        self.dealer_aces = np.zeros(k, dtype=np.int64)
+        self.dealer_cards = np.zeros(k, dtype=np.int64)
+        self.up = np.zeros(k, dtype=np.int64)
+        self.hole = np.zeros(k, dtype=np.int64)
+
+    def take(self, sel: np.ndarray) -> np.ndarray:
+        values = self.shoes[self.rows[sel], self.cursor[sel]].astype(np.int64)
+        self.cursor[sel] += 1
+        return values
+
+    def see(self, sel: np.ndarray, values: np.ndarray):
+        self.running_count[sel] += self.tags[values]
+        self.seen[sel] += 1
+
+    def draw(self, sel: np.ndarray) -> np.ndarray:
+        values = self.take(sel)
+        self.see(sel, values)
+        return values
+
+    def deal(self, h: int, sel: np.ndarray):
+        values = self.draw(sel)
+        cards = self.cards[h, sel]
+        self.first[h, sel] = np.where(cards == 0, values, self.first[h, sel])
+        self.second[h, sel] = np.where(cards == 1, values, self.second[h, sel])
+        self.hard[h, sel] += np.where(values == 11, 1, values)
+        self.aces[h, sel] += values == 11
+        self.cards[h, sel] += 1
+
+    def deal_dealer(self, sel: np.ndarray):
+        # Dealer.deal burns a card every time the dealer draws for itself, and the hole card is seen when revealed
+        self.cursor[sel] += 1
+        values = self.take(sel)
+        hole = self.dealer_cards[sel] == 1
+        self.see(sel[~hole], values[~hole])
+        self.hole[sel] = np.where(hole, values, self.hole[sel])
+        self.up[sel] = np.where(self.dealer_cards[sel] == 0, values, self.up[sel])
+        self.dealer_hard[sel] += np.where(values == 11, 1, values)
+        self.dealer_aces[sel] += values == 11
+        self.dealer_cards[sel] += 1
+
+    def split(self, sel: np.ndarray):
+        # Player.split moves the first card to the second hand
+        for h, values in ((1, self.first[0, sel]), (0, self.second[0, sel])):
+            self.first[h, sel] = values
+            self.second[h, sel] = 0
+            self.hard[h, sel] = np.where(values == 11, 1, values)
+            self.aces[h, sel] = values == 11
+            self.cards[h, sel] = 1
+
+    def total(self, h: int, sel=slice(None)) -> np.ndarray:
+        return hand_total(self.hard[h, sel], self.aces[h, sel])
+
+    def dealer_total(self, sel=slice(None)) -> np.ndarray:
+        return hand_total(self.dealer_hard[sel], self.dealer_aces[sel])
+
+    def pair(self, h: int, sel=slice(None)) -> np.ndarray:
+        return (self.cards[h, sel] == 2) & (self.first[h, sel] == self.second[h, sel])
+
+    def true_count(self, sel) -> np.ndarray:
+        # array version of counting.decks_remaining and ShoeCounter.true_count
+        unseen = self.shoes.shape[1] - self.seen[sel]
+        if self.deck_resolution:
+            decks = np.ceil(unseen / (CARD_COUNT_PER_DECK * self.deck_resolution)) * self.deck_resolution
+        else:
+            decks = unseen / CARD_COUNT_PER_DECK
+        return np.where(decks == 0, 0, self.running_count[sel] / np.where(decks == 0, 1, decks))
+
+    def decide(self, h: int, sel: np.ndarray, can_double, can_split: bool) -> np.ndarray:
+        return decide(self.hard[h, sel], self.aces[h, sel], self.pair(h, sel), self.up[sel],
+                      self.true_count(sel), can_double, can_split)
+
+    def hit_until_done(self, sel: np.ndarray):
+        # mirrors the hit loop of Blackjack.__play, a DOUBLE after a hit ends the hand without a card
+        while len(sel):
+            self.deal(0, sel)
+            total = self.total(0, sel)
+            sel = sel[~((self.cards[0, sel] == 7) & (total <= 21))]
+            move = self.decide(0, sel, False, False)
+            self.doubled[0, sel] |= move == DOUBLE
+            sel = sel[move == HIT]
+
+    def play_split_hand(self, h: int, sel: np.ndarray):
+        # mirrors Blackjack.handle_player_split
+        self.deal(h, sel)
+        while len(sel):
+            move = self.decide(h, sel, self.cards[h, sel] == 2, False)
+            sel = sel[move != STAY]
+            move = move[move != STAY]
+            self.deal(h, sel)
+            self.doubled[h, sel] |= move == DOUBLE
+            sel = sel[move == HIT]
+
+    def play(self) -> np.ndarray:
+        everyone = np.arange(len(self.rows))
+        # Dealer.start_new_game deals in casino order
+        self.deal(0, everyone)
+        self.deal_dealer(everyone)
+        self.deal(0, everyone)
+        self.deal_dealer(everyone)
+
+        up = self.up
+        total = self.total(0)
+        pair = self.pair(0)
+        ace_split = pair & (self.first[0] == 11)
+        player_blackjack = ~ace_split & (total == 21)
+        dealer_blackjack = self.dealer_total() == 21
+        blackjack = ~ace_split & (player_blackjack | dealer_blackjack)
+        surrender = ~ace_split & ~blackjack & ~pair & (self.aces[0] == 0) & (
+            ((total == 16) & (up >= 9)) | ((total == 15) & (up == 10))
+        )
+        strategy = np.nonzero(~ace_split & ~blackjack & ~surrender)[0]
+
+        sel = np.nonzero(ace_split)[0]
+        self.split(sel)
+        self.deal(0, sel)
+        self.deal(1, sel)
+
+        move = self.decide(0, strategy, True, True)
+        sel = strategy[move == DOUBLE]
+        self.doubled[0, sel] = True
+        self.deal(0, sel)
+        self.hit_until_done(strategy[move == HIT])
+        sel = strategy[move == SPLIT]
+        self.split(sel)
+        self.play_split_hand(0, sel)
+        self.play_split_hand(1, sel)
+
+        two_hands = self.cards[1] > 0
+        busted = np.stack([self.total(0) > 21, self.total(1) > 21])
+        all_busted = busted[0] & (busted[1] | ~two_hands)
+        # Blackjack.dealer_move reveals the hole card before the dealer draws
+        self.see(everyone, self.hole)
+        dealer_draws = np.nonzero(~all_busted & ~surrender & ~player_blackjack & ~dealer_blackjack)[0]
+        while len(dealer_draws):
+            dealer_draws = dealer_draws[self.dealer_total(dealer_draws) < 17]
+            self.deal_dealer(dealer_draws)
+
+        return self.resolve(two_hands, busted, surrender, player_blackjack, dealer_blackjack)
+
+    def hand_point(self, h: int, dealer_total: np.ndarray, dealer_busted: np.ndarray) -> np.ndarray:
+        # mirrors Blackjack.get_hand_point, in half points
+        total = self.total(h)
+        stake = np.where(self.doubled[h], 4, 2)
+        return np.select(
+            [
+                (self.cards[h] == 7) & (total <= 21),
+                total == dealer_total,
+                (total < dealer_total) & ~dealer_busted,
+            ],
+            [2, 0, -stake],
+            stake
+        )
+
+    def resolve(self, two_hands, busted, surrender, player_blackjack, dealer_blackjack) -> np.ndarray:
+        # mirrors Blackjack.resolve_game, in half points
+        dealer_total = self.dealer_total()
+        dealer_busted = dealer_total > 21
+        total = self.total(0)
+        stake = np.where(self.doubled[0], 4, 2)
+        first_two = hand_total(
+            np.where(self.first[0] == 11, 1, self.first[0]) + np.where(self.second[0] == 11, 1, self.second[0]),
+            (self.first[0] == 11).astype(np.int64) + (self.second[0] == 11)
+        )
+
+        single = np.select(
+            [
+                (self.aces[0] > 0) & (first_two == 14) & (self.up == 6) & (dealer_total != total),
+                (self.cards[0] == 7) & (total <= 21),
+                busted[0],
+                surrender,
+                dealer_busted,
+                total == dealer_total,
+                total < dealer_total,
+            ],
+            [
+                np.where(dealer_total > total, -4, 4),
+                2,
+                -stake,
+                -1,
+                stake,
+                0,
+                -stake,
+            ],
+            stake
+        )
+
+        points = [self.hand_point(h, dealer_total, dealer_busted) for h in (0, 1)]
+        split = np.select(
+            [busted[0] & busted[1], busted[0], busted[1]],
+            [-4, points[1] - 2, points[0] - 2],
+            points[0] + points[1]
+        )
+
+        return np.select(
+            [
+                player_blackjack & dealer_blackjack,
+                dealer_blackjack,
+                player_blackjack,
+                two_hands,
+            ],
+            [0, -2, 3, split],
+            single
+        )
+
+
+def _play_games(shoes: np.ndarray, max_cards: int, count_system: str,
+                deck_resolution: float) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # one game at a time on every shoe left: the shoes played, the true count before the first card and the payouts
+    shoes = np.asarray(shoes, dtype=np.int8)
+    cursor = np.zeros(len(shoes), dtype=np.int64)
+    running_count = np.zeros(len(shoes), dtype=np.int64)
+    seen = np.zeros(len(shoes), dtype=np.int64)
+    tags = COUNT_TAGS[count_system]
+
+    rows = np.nonzero(cursor < max_cards)[0]
+    while len(rows):
+        game = _Round(shoes, rows, cursor, running_count, seen, tags, deck_resolution)
+        bet_count = game.true_count(slice(None))
+        yield rows, bet_count, game.play()
+        cursor[rows] = game.cursor
+        running_count[rows] = game.running_count
+        seen[rows] = game.seen
+        rows = rows[cursor[rows] < max_cards]
+
+
+def play_shoes(shoes: np.ndarray, max_cards: int = MAX_CARDS_PER_SERIES, count_system: str = DEFAULT_COUNT_SYSTEM,
+               deck_resolution: float = DECK_RESOLUTION) -> Tuple[np.ndarray, int]:
+    """Play every shoe to the penetration cutoff, returns the payout histogram (in half points) and games played"""
+    payouts = np.zeros(PAYOUT_BINS, dtype=np.int64)
+    games = 0
+    for rows, _, points in _play_games(shoes, max_cards, count_system, deck_resolution):
+        payouts += np.bincount(points + MAX_PAYOUT, minlength=PAYOUT_BINS)
+        games += len(rows)
+    return payouts, games
+
+
+def play_rounds(shoes: np.ndarray, max_cards: int = MAX_CARDS_PER_SERIES, count_system: str = DEFAULT_COUNT_SYSTEM,
+                deck_resolution: float = DECK_RESOLUTION) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Every game of every shoe in the order dealt: its shoe, the true count its bet was placed at and its payout
+    in half points"""
+    games = list(_play_games(shoes, max_cards, count_system, deck_resolution))
+    if not games:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+    rows, bet_count, points = (np.concatenate(column) for column in zip(*games))
+    # games were played a round across all shoes at a time, a stable sort keeps each shoe's games in order
+    order = np.argsort(rows, kind='stable')
+    return rows[order], bet_count[order], points[order]
+
+
+def to_results(payouts: np.ndarray) -> Dict[str, int]:
+    """Converts a half point histogram into the payout string keys used by Blackjack.results"""
+    results = {}
+    for index in np.nonzero(payouts)[0]:
+        half_points = int(index) - MAX_PAYOUT
+        key = str(half_points // 2) if half_points % 2 == 0 else str(half_points / 2)
+        results[key] = int(payouts[index])
+    return results
+
+
+def play_shoes_objects(shoes: np.ndarray, max_cards: int = MAX_CARDS_PER_SERIES,
+                       count_system: str = DEFAULT_COUNT_SYSTEM,
+                       deck_resolution: float = DECK_RESOLUTION,
+                       export_file: Optional[str] = None) -> Tuple[Dict[str, int], int]:
+    """Plays the same shoes through the object engine in game_play"""
+    from game_play import Blackjack
+    from settings import GameConfig
+
+    decks = shoes.shape[1] // CARD_COUNT_PER_DECK
+    bj = Blackjack(GameConfig(max_games=0, decks=decks, penetration=max_cards / shoes.shape[1],
+                              interactive=False, export_file=export_file, count_system=count_system,
+                              deck_resolution=deck_resolution))
+    for shoe in shoes.tolist():
+        bj.dealer.deck.cards = [CARDS_BY_VALUE[value] for value in shoe]
+        bj.play_shoe()
+    bj.close()
+    return bj.results.as_results(), bj.game
+
+
+def verify_parity(seeds=range(5), n_shoes: int = 200, count_system: str = DEFAULT_COUNT_SYSTEM,
+                  deck_resolution: float = DECK_RESOLUTION) -> List[int]:
+    """Returns the seeds for which both engines do not produce the same histogram"""
+    mismatches = []
+    for seed in seeds:
+        shoes = deal_shoes(n_shoes, np.random.default_rng(seed))
+        payouts, games = play_shoes(shoes, count_system=count_system, deck_resolution=deck_resolution)
+        results, object_games = play_shoes_objects(shoes, count_system=count_system, deck_resolution=deck_resolution)
+        if to_results(payouts) != results or games != object_games:
+            mismatches.append(seed)
+    return mismatches
+
+
+def benchmark(n_shoes: int, seed: int = 0) -> Dict[str, float]:
+    shoes = deal_shoes(n_shoes, np.random.default_rng(seed))
+
+    start = time.perf_counter()
+    _, games = play_shoes(shoes)
+    vectorized = games / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    _, games = play_shoes_objects(shoes)
+    objects = games / (time.perf_counter() - start)
+
+    return {"vectorized": vectorized, "objects": objects}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy batch shoe engine")
+    parser.add_argument("--shoes", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="check parity with the object engine")
+    parser.add_argument("--count-system", choices=tuple(COUNT_SYSTEMS), default=DEFAULT_COUNT_SYSTEM)
+    parser.add_argument("--deck-resolution", type=float, default=DECK_RESOLUTION)
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify_parity(range(args.seed, args.seed + 5), count_system=args.count_system,
+                                   deck_resolution=args.deck_resolution)
+        print("Parity OK" if not mismatches else f"Parity mismatch for seeds {mismatches}")
+        exit(1 if mismatches else 0)
+
+    for engine, hands_per_sec in benchmark(args.shoes, args.seed).items():
+        print(f"{engine:<12} {hands_per_sec:>14,.0f} hands/sec")
+
+
+if __name__ == '__main__':
+    main()